@@ -1,16 +1,20 @@
 from .logic_engine import LogicEngine
 from .models import Rule
 from .state_manager import StateManager
+from .session_store import SessionStore
 from .built_in_functions import BuiltInFunctions
 from .validator import SchemaValidator, ValidationError, RuleConflictDetector, DependencyResolver
 from .config import set_api_key, get_api_key
-from .llm import generate_environment, EnvironmentGenerator
+from .llm import generate_environment, generate_many, EnvironmentGenerator, PromptCache
+from .render import render_grid, print_state
+from .runner import run_script, run_scripts, load_environment_file
 
 __all__ = [
     # Core engine
     "LogicEngine",
     "Rule",
     "StateManager",
+    "SessionStore",
     "BuiltInFunctions",
     
     # Validation
@@ -25,5 +29,16 @@ __all__ = [
     
     # LLM integration
     "generate_environment",
+    "generate_many",
     "EnvironmentGenerator",
+    "PromptCache",
+    
+    # Rendering
+    "render_grid",
+    "print_state",
+    
+    # Headless runs
+    "run_script",
+    "run_scripts",
+    "load_environment_file",
 ]
@@ -0,0 +1,38 @@
+# Gunicorn settings for the Flatland MCP server:
+#   gunicorn -c gunicorn.conf.py mcp_server:app
+import logging
+import os
+from typing import Any
+
+bind = os.getenv("FLATLAND_BIND", "127.0.0.1:5003")
+# Games live in the memory of the process that created them (see SessionStore),
+# so run one worker and get concurrency from threads. More workers need a shared,
+# write-through session store, which Flatland does not provide.
+workers = int(os.getenv("FLATLAND_WORKERS", "1"))
+# "gthread" serves each request on a thread; "gevent" (pip install flatland[server])
+# multiplexes many in-flight LLM calls per worker on patched sockets
+worker_class = os.getenv("FLATLAND_WORKER_CLASS", "gthread")
+threads = int(os.getenv("FLATLAND_THREADS", "8"))
+worker_connections = int(os.getenv("FLATLAND_WORKER_CONNECTIONS", "1000"))
+# LLM generation can take well over gunicorn's default 30 second timeout
+timeout = 300
+# Hold idle connections open between a client's actions so it reuses the TCP
+# (and TLS) connection instead of reconnecting; gunicorn's default is 2 seconds.
+# Only the gthread and gevent workers keep connections alive.
+keepalive = int(os.getenv("FLATLAND_KEEPALIVE", "30"))
+
+# Application log level; workers inherit this configuration from the master
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s"
+)
+
+
+def on_starting(server: Any) -> None:
+    """Warn when the session store is split across several worker processes."""
+    if server.cfg.workers > 1:
+        server.log.warning(
+            "Running %d workers: games are kept per worker, so a game_id only "
+            "works on the worker that created it. Use FLATLAND_WORKERS=1.",
+            server.cfg.workers
+        )
@@ -1,52 +1,356 @@
 import flask
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask.typing import ResponseReturnValue
+import hashlib
 import json
-import uuid # For generating unique game IDs
+import logging
+import secrets # For generating unique game IDs
 import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # Flatland core components (now in src/flatland)
+from flatland import io_json
 from flatland.logic_engine import LogicEngine
-from flatland.llm.client import generate_environment, FlatlandLLMError, SchemaValidationError, RateLimitError as FlatlandRateLimitError
+from flatland.session_store import SessionStore
+from flatland.llm.cache import PromptCache
+from flatland.llm.client import EnvironmentGenerator, FlatlandLLMError, SchemaValidationError, RateLimitError as FlatlandRateLimitError
 from flatland.schemas import ENVIRONMENT_SCHEMA, EnvironmentDefinition # ENVIRONMENT_SCHEMA is the dict, EnvironmentDefinition is the class
 
+log = logging.getLogger("flatland.mcp")
+
+
+def _prefers_msgpack() -> bool:
+    """Whether the current request's Accept header prefers MessagePack over JSON."""
+    return msgpack is not None and bool(request) and request.accept_mimetypes.best_match(
+        ["application/json", "application/msgpack"]
+    ) == "application/msgpack"
+
+
+class IoJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes through flatland.io_json (orjson when installed).
+
+    Clients that prefer "application/msgpack" in their Accept header get
+    MessagePack bodies instead, which are smaller for numeric grids.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return io_json.dumps(obj, default=self.default)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return io_json.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> flask.Response:
+        # Build the body as bytes in one call; skips the str round-trip and
+        # debug-mode pretty printing of the default provider
+        obj = args[0] if len(args) == 1 else (list(args) or kwargs)
+        if _prefers_msgpack():
+            return flask.current_app.response_class(
+                msgpack.packb(obj, use_bin_type=True, default=self.default),
+                mimetype="application/msgpack"
+            )
+        return flask.current_app.response_class(
+            io_json.dumpb(obj, default=self.default),
+            mimetype=self.mimetype
+        )
+
+
 app = Flask(__name__)
+# jsonify() and request.get_json() both go through app.json
+app.json = IoJSONProvider(app)
 
-# In-memory store for active game engines (game_id -> LogicEngine instance)
-active_games: dict[str, LogicEngine] = {}
+# Active game engines (game_id -> LogicEngine instance). The least recently used
+# games beyond max_live are snapshotted to SQLite and rebuilt on their next request;
+# games idle for longer than the TTL are discarded.
+active_games = SessionStore(
+    max_live=int(os.getenv("FLATLAND_MAX_LIVE_GAMES", "256")),
+    path=os.getenv("FLATLAND_SESSION_DB", ":memory:"),
+    ttl=float(os.getenv("FLATLAND_SESSION_TTL", "1800"))
+)
+# Generated environments keyed by normalized (prompt, style guidance), so repeated
+# prompts skip the LLM call and only get a fresh engine and game_id. Off unless
+# FLATLAND_PROMPT_CACHE=1, since a hit returns the same environment every time.
+prompt_cache: Optional[PromptCache] = None
+if os.getenv("FLATLAND_PROMPT_CACHE", "0") == "1":
+    prompt_cache = PromptCache(
+        max_entries=1024,
+        path=os.getenv("FLATLAND_PROMPT_CACHE_DB"),
+        ttl=float(os.getenv("FLATLAND_PROMPT_CACHE_TTL", "3600"))
+    )
+# Default cap on generated tokens for create_game_from_prompt; requests may
+# override it with "max_output_tokens"
+DEFAULT_MAX_OUTPUT_TOKENS = int(os.getenv("FLATLAND_MAX_OUTPUT_TOKENS", "2048"))
 environment_schema_content: dict = {}
 
-def load_environment_schema():
-    """Loads the Flatland environment schema."""
-    global environment_schema_content
+
+@lru_cache(maxsize=None)
+def _environment_generator(api_key: str) -> EnvironmentGenerator:
+    """Return the cache-backed generator for an API key."""
+    return EnvironmentGenerator(api_key=api_key, cache=prompt_cache)
+
+
+# Games requested with "batch": true are generated through the OpenAI Batch API
+# (discounted, up to 24h). Requests are buffered and submitted together once
+# BATCH_MAX_PENDING are waiting or the oldest has waited BATCH_MAX_AGE seconds.
+BATCH_MAX_PENDING = int(os.getenv("FLATLAND_BATCH_MAX_PENDING", "100"))
+BATCH_MAX_AGE = float(os.getenv("FLATLAND_BATCH_MAX_AGE", "60"))
+# Failed batch games are reported for as long as an idle game is kept
+BATCH_FAILED_TTL = active_games.ttl
+_batch_lock = threading.Lock()  # guards _pending_batch, _batch_timer, batch_games and _batch_failed_at
+_pending_batch: list = []  # (game_id, prompt_text, style_guidance)
+_batch_timer = None
+batch_games: dict = {}  # game_id -> "queued" | "failed"; removed once the game is ready
+# game_id -> time of failure, oldest first, so failed entries can expire
+_batch_failed_at: "OrderedDict[str, float]" = OrderedDict()
+
+
+def _queue_batch_game(game_id: str, prompt_text: str, style_guidance: Optional[str]) -> None:
+    """Buffer a batch generation request, submitting the buffer when it is full."""
+    global _batch_timer
+    with _batch_lock:
+        batch_games[game_id] = "queued"
+        _pending_batch.append((game_id, prompt_text, style_guidance))
+        if len(_pending_batch) >= BATCH_MAX_PENDING:
+            _flush_batch_locked()
+        elif _batch_timer is None:
+            _batch_timer = threading.Timer(BATCH_MAX_AGE, _flush_batch)
+            _batch_timer.daemon = True
+            _batch_timer.start()
+
+
+def _batch_status(game_id: str) -> Optional[str]:
+    """Return "queued" or "failed" for a batch game that is not playable yet."""
+    with _batch_lock:
+        _expire_failed_batch_games_locked()
+        return batch_games.get(game_id)
+
+
+def _forget_batch_game(game_id: str) -> bool:
+    """Drop a batch game's status; returns True if it had one."""
+    with _batch_lock:
+        _batch_failed_at.pop(game_id, None)
+        return batch_games.pop(game_id, None) is not None
+
+
+def _finish_batch_game(game_id: str, engine: Optional[LogicEngine]) -> None:
+    """Make a generated game playable, or mark it failed when engine is None."""
+    with _batch_lock:
+        if game_id not in batch_games:
+            # Ended while it was queued
+            return
+        if engine is not None:
+            active_games.put(game_id, engine)
+            del batch_games[game_id]
+            return
+        batch_games[game_id] = "failed"
+        _batch_failed_at[game_id] = time.time()
+        _expire_failed_batch_games_locked()
+
+
+def _expire_failed_batch_games_locked() -> None:
+    """Forget failed batch games older than BATCH_FAILED_TTL; caller holds _batch_lock."""
+    cutoff = time.time() - BATCH_FAILED_TTL
+    while _batch_failed_at:
+        game_id, failed_at = next(iter(_batch_failed_at.items()))
+        if failed_at >= cutoff:
+            break
+        del _batch_failed_at[game_id]
+        batch_games.pop(game_id, None)
+
+
+def _flush_batch() -> None:
+    """Submit all buffered batch requests."""
+    with _batch_lock:
+        _flush_batch_locked()
+
+
+def _flush_batch_locked() -> None:
+    """Hand the buffered requests to a background thread; caller holds _batch_lock."""
+    global _batch_timer
+    if _batch_timer is not None:
+        _batch_timer.cancel()
+        _batch_timer = None
+    if not _pending_batch:
+        return
+    jobs = list(_pending_batch)
+    _pending_batch.clear()
+    api_key = os.getenv("FLATLAND_OPENAI_KEY") or os.getenv("OPENAI_API_KEY")
+    threading.Thread(target=_run_batch, args=(jobs, api_key), daemon=True).start()
+
+
+def _run_batch(jobs: list, api_key: str) -> None:
+    """Generate queued games through the Batch API and make them playable."""
+    try:
+        generator = _environment_generator(api_key)
+    except Exception as e:
+        log.error("Batch generation failed: %s", e)
+        for game_id, _, _ in jobs:
+            _finish_batch_game(game_id, None)
+        return
+    # Style guidance is shared by a whole batch, so submit one batch per style
+    by_style: dict = {}
+    for game_id, prompt_text, style_guidance in jobs:
+        by_style.setdefault(style_guidance, []).append((game_id, prompt_text))
+    for style_guidance, style_jobs in by_style.items():
+        try:
+            env_definitions = generator.generate_batch(
+                [prompt_text for _, prompt_text in style_jobs],
+                style_guidance=style_guidance
+            )
+        except Exception as e:
+            log.error("Batch generation failed: %s", e)
+            env_definitions = []
+        if len(env_definitions) != len(style_jobs):
+            log.error("Batch returned %d results for %d games", len(env_definitions), len(style_jobs))
+        for i, (game_id, _) in enumerate(style_jobs):
+            # Games without a result fail rather than staying queued forever
+            env_definition = env_definitions[i] if i < len(env_definitions) else None
+            engine = None
+            if env_definition is not None:
+                try:
+                    engine = LogicEngine()
+                    engine.load_environment(env_definition.to_dict())
+                except Exception as e:
+                    log.error("Error loading batch game %s: %s", game_id, e)
+                    engine = None
+            _finish_batch_game(game_id, engine)
+
+
+# The schema never changes after loading, so its response body is encoded once
+_SCHEMA_RESPONSE_BYTES: bytes = b""
+_SCHEMA_ETAG: str = ""
+
+
+def load_environment_schema() -> None:
+    """Loads the Flatland environment schema and pre-encodes its response body."""
+    global environment_schema_content, _SCHEMA_RESPONSE_BYTES, _SCHEMA_ETAG
     if ENVIRONMENT_SCHEMA:
         environment_schema_content = ENVIRONMENT_SCHEMA
-        print("Flatland Environment Schema loaded successfully.")
+        _SCHEMA_RESPONSE_BYTES = io_json.dumpb({"success": True, "schema": environment_schema_content})
+        _SCHEMA_ETAG = hashlib.blake2b(_SCHEMA_RESPONSE_BYTES, digest_size=8).hexdigest()
+        log.info("Flatland Environment Schema loaded successfully.")
     else:
-        print(f"Error: Flatland ENVIRONMENT_SCHEMA not found or empty.")
+        log.error("Flatland ENVIRONMENT_SCHEMA not found or empty.")
         environment_schema_content = {"error": "Flatland Environment Schema not loaded"}
 
+
+def _warm() -> None:
+    """Builds the LLM client and its connection pool up front, so the first
+    create_game_from_prompt request does not pay for it."""
+    api_key = os.getenv("FLATLAND_OPENAI_KEY") or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return
+    try:
+        _environment_generator(api_key)
+    except Exception as e:
+        log.warning("Could not initialize the LLM client at startup: %s", e)
+
+
+# Load at import so the schema is available when served by a WSGI server
+load_environment_schema()
+_warm()
+
+
+def _new_game_id() -> str:
+    """Random 16-character URL-safe game id (96 bits)."""
+    return secrets.token_urlsafe(12)
+
+
+def _sse(payload: dict) -> bytes:
+    """Encode one Server-Sent Events frame."""
+    return b"data: " + io_json.dumpb(payload) + b"\n\n"
+
+
+def _stream_game(
+    generator: EnvironmentGenerator, prompt_text: str, style_guidance: Optional[str], max_tokens: int
+) -> Iterator[bytes]:
+    """Yield SSE frames while an environment streams in, ending with the created game."""
+    try:
+        env_definition = None
+        received = 0
+        for event in generator.generate_stream(prompt_text, style_guidance, max_tokens=max_tokens):
+            if event["type"] == "delta":
+                received += len(event["content"])
+                yield _sse({"type": "progress", "chars": received})
+            elif event["type"] == "grid":
+                yield _sse({"type": "grid", "grid": event["grid"]})
+            else:
+                env_definition = event["environment"]
+
+        engine = LogicEngine()
+        engine.load_environment(env_definition.to_dict())
+        game_id = _new_game_id()
+        active_games.put(game_id, engine)
+        yield _sse({
+            "type": "game",
+            "success": True,
+            "game_id": game_id,
+            "initial_state": engine.get_current_state()
+        })
+    except FlatlandRateLimitError as e:
+        yield _sse({"type": "error", "success": False, "message": f"LLM Rate Limit Error: {e}", "retry_after": e.retry_after})
+    except FlatlandLLMError as e:
+        yield _sse({"type": "error", "success": False, "message": f"Error generating environment with LLM: {e}"})
+    except Exception as e:
+        log.exception("Error in streamed create_game_from_prompt")
+        yield _sse({"type": "error", "success": False, "message": f"An unexpected error occurred: {str(e)}"})
+
+def _json_body(*required: str) -> Optional[Dict[str, Any]]:
+    """Returns the request's JSON object if it has all required keys, else None.
+
+    Malformed JSON and non-object bodies also give None, so endpoints answer
+    them with their own JSON 400 instead of an HTML error page.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or any(key not in data for key in required):
+        return None
+    return data
+
 # --- MCP Tool Implementations as HTTP Endpoints ---
 
 @app.route('/mcp/get_environment_schema', methods=['POST'])
-def mcp_get_environment_schema():
+def mcp_get_environment_schema() -> ResponseReturnValue:
     """MCP Tool: get_environment_schema"""
     if environment_schema_content and "error" not in environment_schema_content:
-        return jsonify({"success": True, "schema": environment_schema_content}), 200
+        if _prefers_msgpack():
+            return jsonify({"success": True, "schema": environment_schema_content}), 200
+        # make_conditional() only handles GET/HEAD, and this tool is a POST
+        if request.if_none_match.contains(_SCHEMA_ETAG):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(_SCHEMA_RESPONSE_BYTES, mimetype="application/json")
+        response.set_etag(_SCHEMA_ETAG)
+        response.cache_control.public = True
+        response.cache_control.max_age = 300
+        return response
     else:
         return jsonify({"success": False, "message": "Flatland Environment Schema not available."}), 500
 
 @app.route('/mcp/create_game_from_prompt', methods=['POST'])
-def mcp_create_game_from_prompt():
+def mcp_create_game_from_prompt() -> ResponseReturnValue:
     """MCP Tool: create_game_from_prompt"""
-    data = request.get_json()
-    if not data or 'prompt_text' not in data:
+    data = _json_body('prompt_text')
+    if data is None:
         return jsonify({"success": False, "message": "Missing 'prompt_text' in request."}), 400
 
     prompt_text = data['prompt_text']
     style_guidance = data.get('style_guidance') # Optional
+    # Output is generated token by token, so a lower cap returns sooner
+    max_tokens = data.get('max_output_tokens', DEFAULT_MAX_OUTPUT_TOKENS)
+    if not isinstance(max_tokens, int) or isinstance(max_tokens, bool) or max_tokens <= 0:
+        return jsonify({"success": False, "message": "'max_output_tokens' must be a positive integer."}), 400
 
     try:
-        print(f"Generating environment for prompt: '{prompt_text}'...")
+        log.info("Generating environment for prompt: %r", prompt_text)
         # Ensure API key is available for the LLM client
         if not os.getenv("FLATLAND_OPENAI_KEY") and not os.getenv("OPENAI_API_KEY"):
             # Try to set it from OPENAI_API_KEY if FLATLAND_OPENAI_KEY is not set,
@@ -54,23 +358,45 @@ def mcp_create_game_from_prompt():
             openai_key = os.getenv("OPENAI_API_KEY")
             if openai_key:
                 os.environ["FLATLAND_OPENAI_KEY"] = openai_key
-                print("Using OPENAI_API_KEY for Flatland LLM.")
+                log.info("Using OPENAI_API_KEY for Flatland LLM.")
             else:
                  return jsonify({"success": False, "message": "OpenAI API key (FLATLAND_OPENAI_KEY or OPENAI_API_KEY) not set."}), 500
 
+        if data.get('batch') is True:
+            game_id = _new_game_id()
+            _queue_batch_game(game_id, prompt_text, style_guidance)
+            return jsonify({
+                "success": True,
+                "game_id": game_id,
+                "status": "queued",
+                "message": "Game queued for batch generation; poll get_game_state until it is ready."
+            }), 202
+
+        if data.get('stream') is True or request.accept_mimetypes.best_match(
+            ["application/json", "text/event-stream"]
+        ) == "text/event-stream":
+            # Progress frames while the model writes, then a final "game" frame
+            generator = _environment_generator(os.getenv("FLATLAND_OPENAI_KEY") or os.getenv("OPENAI_API_KEY"))
+            return app.response_class(
+                stream_with_context(_stream_game(generator, prompt_text, style_guidance, max_tokens)),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
 
-        env_definition: EnvironmentDefinition = generate_environment(
+        generator = _environment_generator(os.getenv("FLATLAND_OPENAI_KEY") or os.getenv("OPENAI_API_KEY"))
+        env_definition: EnvironmentDefinition = generator.generate(
             description=prompt_text,
-            style_guidance=style_guidance
+            style_guidance=style_guidance,
+            max_tokens=max_tokens
         )
-        print("Environment generated successfully by LLM.")
+        log.debug("Environment generated successfully by LLM.")
 
         engine = LogicEngine()
         engine.load_environment(env_definition.to_dict()) # LogicEngine expects a dict
-        print("Environment loaded into LogicEngine.")
+        log.debug("Environment loaded into LogicEngine.")
 
-        game_id = str(uuid.uuid4())
-        active_games[game_id] = engine
+        game_id = _new_game_id()
+        active_games.put(game_id, engine)
         
         # The initial state is implicitly set when loading the environment.
         # LogicEngine.get_current_state() should provide what's needed.
@@ -84,36 +410,44 @@ def mcp_create_game_from_prompt():
         }), 201
 
     except FlatlandRateLimitError as e:
-        print(f"LLM Rate Limit Error: {e}")
-        return jsonify({"success": False, "message": f"LLM Rate Limit Error: {e.message}", "retry_after": e.retry_after}), 429
+        log.warning("LLM Rate Limit Error: %s", e)
+        return jsonify({"success": False, "message": f"LLM Rate Limit Error: {e}", "retry_after": e.retry_after}), 429
     except SchemaValidationError as e:
-        print(f"LLM Schema Validation Error: {e}")
-        return jsonify({"success": False, "message": f"LLM generated data failed schema validation: {e.message}", "errors": e.validation_errors}), 500
+        log.warning("LLM Schema Validation Error: %s", e)
+        return jsonify({"success": False, "message": f"LLM generated data failed schema validation: {e}", "errors": e.validation_errors}), 500
     except FlatlandLLMError as e:
-        print(f"Flatland LLM Error: {e}")
-        return jsonify({"success": False, "message": f"Error generating environment with LLM: {e.message}"}), 500
+        log.error("Flatland LLM Error: %s", e)
+        return jsonify({"success": False, "message": f"Error generating environment with LLM: {e}"}), 500
     except Exception as e:
-        print(f"Error in create_game_from_prompt: {e}")
+        log.exception("Error in create_game_from_prompt")
         return jsonify({"success": False, "message": f"An unexpected error occurred: {str(e)}"}), 500
 
 
 @app.route('/mcp/submit_player_action', methods=['POST'])
-def mcp_submit_player_action():
-    """MCP Tool: submit_player_action"""
-    data = request.get_json()
-    if not data or 'game_id' not in data or 'command' not in data: # Changed 'action_key' to 'command'
+def mcp_submit_player_action() -> ResponseReturnValue:
+    """MCP Tool: submit_player_action
+
+    With "since_version" set to the state version the client already has,
+    the response carries a diff of the state instead of the full state.
+    """
+    data = _json_body('game_id', 'command') # Changed 'action_key' to 'command'
+    if data is None:
         return jsonify({"success": False, "message": "Missing 'game_id' or 'command'."}), 400
 
     game_id = data['game_id']
     command = data['command']
+    since_version = data.get('since_version')
 
-    engine = active_games.get(game_id)
-    if not engine:
-        return jsonify({"success": False, "message": f"Game with ID '{game_id}' not found."}), 404
-    
     try:
-        # LogicEngine.process_input directly returns the new state or an error structure
-        new_state = engine.process_input(command)
+        # LogicEngine.process_input directly returns the new state or an error structure.
+        # Only requests for the same game wait on each other here.
+        with active_games.use(game_id) as engine:
+            if not engine:
+                return jsonify({"success": False, "message": f"Game with ID '{game_id}' not found."}), 404
+            if since_version is not None:
+                new_state = engine.process_input_diff(command, since_version)
+            else:
+                new_state = engine.process_input(command)
         
         # Check for victory/failure conditions based on the new state
         # LogicEngine might update its internal state regarding victory/failure
@@ -124,43 +458,131 @@ def mcp_submit_player_action():
 
         return jsonify({"success": True, "new_state": new_state, "message": "Action processed."}), 200
     except Exception as e:
-        print(f"Error processing player action for game {game_id}: {e}")
+        log.exception("Error processing player action for game %s", game_id)
         # LogicEngine's process_input might raise specific exceptions for invalid commands
         return jsonify({"success": False, "message": f"Error processing action: {str(e)}"}), 500
 
 
+@app.route('/mcp/submit_player_actions', methods=['POST'])
+def mcp_submit_player_actions() -> ResponseReturnValue:
+    """MCP Tool: submit_player_actions
+
+    Applies a list of commands in one request, for replays and bots. Stops
+    early on victory or failure. Only the final result is returned unless
+    "return_intermediate" is true.
+    """
+    data = _json_body('game_id', 'commands')
+    if data is None or not isinstance(data['commands'], list) or not data['commands']:
+        return jsonify({"success": False, "message": "Missing 'game_id' or non-empty 'commands' list."}), 400
+
+    game_id = data['game_id']
+    commands = data['commands']
+    return_intermediate = data.get('return_intermediate') is True
+
+    try:
+        results = []
+        with active_games.use(game_id) as engine:
+            if not engine:
+                return jsonify({"success": False, "message": f"Game with ID '{game_id}' not found."}), 404
+            for command in commands:
+                new_state = engine.process_input(command)
+                results.append(new_state)
+                if new_state.get("victory") or new_state.get("failure"):
+                    break
+
+        response = {
+            "success": True,
+            "new_state": results[-1],
+            "processed_count": len(results),
+            "message": "Actions processed."
+        }
+        if return_intermediate:
+            response["intermediate_states"] = results
+        return jsonify(response), 200
+    except Exception as e:
+        log.exception("Error processing player actions for game %s", game_id)
+        return jsonify({"success": False, "message": f"Error processing actions: {str(e)}"}), 500
+
+
 @app.route('/mcp/get_game_state', methods=['POST'])
-def mcp_get_game_state():
+def mcp_get_game_state() -> ResponseReturnValue:
     """MCP Tool: get_game_state"""
-    data = request.get_json()
-    if not data or 'game_id' not in data:
+    data = _json_body('game_id')
+    if data is None:
         return jsonify({"success": False, "message": "Missing 'game_id'."}), 400
 
     game_id = data['game_id']
     engine = active_games.get(game_id)
 
     if not engine:
+        status = _batch_status(game_id)
+        if status == "queued":
+            return jsonify({"success": True, "status": "queued", "message": "Game is still being generated."}), 202
+        if status == "failed":
+            return jsonify({"success": False, "status": "failed", "message": "Batch generation failed for this game."}), 500
         return jsonify({"success": False, "message": f"Game with ID '{game_id}' not found."}), 404
     
     try:
-        current_state = engine.get_current_state() # Assuming this returns a serializable dict
+        with engine.lock:
+            current_state = engine.get_current_state() # Assuming this returns a serializable dict
+            version = engine.state_manager.version
         if current_state:
-            return jsonify({"success": True, "current_state": current_state}), 200
+            return jsonify({
+                "success": True,
+                "status": "ready",
+                "current_state": current_state,
+                "version": version
+            }), 200
         else:
             return jsonify({"success": False, "message": "Error retrieving game state (state is None)."}), 500
     except Exception as e:
-        print(f"Error in get_game_state for game {game_id}: {e}")
+        log.exception("Error in get_game_state for game %s", game_id)
         return jsonify({"success": False, "message": f"Error retrieving game state: {str(e)}"}), 500
 
+
+@app.route('/mcp/get_game_environment', methods=['POST'])
+def mcp_get_game_environment() -> ResponseReturnValue:
+    """MCP Tool: get_game_environment
+
+    Returns the full environment definition (rules, victory conditions) for a
+    game. It never changes during a game, so it is not repeated in other
+    responses; clients fetch it once here when they need it.
+    """
+    data = _json_body('game_id')
+    if data is None:
+        return jsonify({"success": False, "message": "Missing 'game_id'."}), 400
+
+    game_id = data['game_id']
+    engine = active_games.get(game_id)
+
+    if not engine:
+        return jsonify({"success": False, "message": f"Game with ID '{game_id}' not found."}), 404
+
+    return jsonify({"success": True, "environment": engine.environment}), 200
+
+@app.route('/mcp/end_game', methods=['POST'])
+def mcp_end_game() -> ResponseReturnValue:
+    """MCP Tool: end_game
+
+    Discards a game and its snapshot. Games are also discarded automatically
+    once idle for FLATLAND_SESSION_TTL seconds.
+    """
+    data = _json_body('game_id')
+    if data is None:
+        return jsonify({"success": False, "message": "Missing 'game_id'."}), 400
+
+    game_id = data['game_id']
+    was_batch_game = _forget_batch_game(game_id)
+    if not active_games.delete(game_id) and not was_batch_game:
+        return jsonify({"success": False, "message": f"Game with ID '{game_id}' not found."}), 404
+
+    return jsonify({"success": True, "message": "Game ended."}), 200
+
 if __name__ == '__main__':
-    load_environment_schema()
-    try:
-        import flask
-    except ImportError:
-        print("Flask is not installed. Please install it: pip install Flask")
-        exit(1)
-    
     # For the LLM client to work, OPENAI_API_KEY or FLATLAND_OPENAI_KEY needs to be set.
     # The create_game_from_prompt endpoint has a check, but good to be aware.
-    print("Starting Flatland MCP Server on http://127.0.0.1:5003") # Changed port
-    app.run(debug=True, port=5003)
+    # The built-in server is for local development only; use gunicorn in production:
+    #   gunicorn -c gunicorn.conf.py mcp_server:app
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    log.info("Starting Flatland MCP Server on http://127.0.0.1:5003") # Changed port
+    app.run(debug=bool(os.environ.get("FLASK_DEV")), port=5003, threaded=True)
@@ -1,6 +1,15 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask.typing import ResponseReturnValue
 from dotenv import load_dotenv
+import logging
 import os
+from typing import Any, Iterator, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import custom modules
 import openai_interface
@@ -8,14 +17,84 @@ import mesa_runner
 
 load_dotenv() # Load environment variables from .env file
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson: compact output, keys kept in insertion order."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+if orjson is not None:
+    # jsonify() and request.get_json() both go through app.json
+    app.json = OrjsonProvider(app)
+log = logging.getLogger(__name__)
+
+
+def _run_generated(user_prompt: str, mesa_code_str: str, model_params: Optional[dict],
+                   steps_to_run: int, reset: bool) -> dict:
+    """Runs generated Mesa code and builds the response payload."""
+    log.debug("Generated Mesa code:\n%s", mesa_code_str)
+
+    # WARNING: This uses exec() and is insecure. For development/MVP only.
+    log.info("Attempting to run Mesa code with params: %s, steps: %s...", model_params, steps_to_run)
+    run = mesa_runner.run_mesa_code_in_worker if mesa_runner.WORKERS > 0 else mesa_runner.run_mesa_code
+    simulation_result = run(
+        mesa_code_str, 
+        model_params=model_params,
+        steps_to_run=steps_to_run,
+        reset=reset
+    )
+    log.debug("Simulation result: %s", simulation_result)
+
+    return {
+        "message": "Mesa code generation and execution attempt complete.",
+        "user_prompt": user_prompt,
+        "generated_code_preview": mesa_code_str.splitlines()[:15], # Preview first 15 lines
+        "simulation_output": simulation_result.get("output"),
+        "simulation_success": simulation_result.get("success"),
+        "simulation_error": simulation_result.get("error")
+    }
+
+
+def _sse(payload: dict) -> str:
+    """Encodes one Server-Sent Events frame."""
+    return f"data: {app.json.dumps(payload)}\n\n"
+
+
+def _stream_generation(user_prompt: str, model_params: Optional[dict], steps_to_run: int,
+                       reset: bool) -> Iterator[str]:
+    """Yields SSE frames as code streams in, ending with the simulation result."""
+    mesa_code_str = ""
+    for event in openai_interface.get_mesa_code_stream(user_prompt):
+        if event["type"] == "delta":
+            yield _sse(event)
+        else:
+            mesa_code_str = event["code"]
+
+    if mesa_code_str.startswith("# Error") or mesa_code_str.startswith("# No prompt"):
+        yield _sse({"type": "error", "error": "Failed to generate Mesa code from prompt.", "details": mesa_code_str})
+        return
+
+    try:
+        result = _run_generated(user_prompt, mesa_code_str, model_params, steps_to_run, reset)
+    except Exception as e:
+        log.exception("Error running streamed Mesa code")
+        yield _sse({"type": "error", "error": f"An unexpected error occurred: {e}"})
+        return
+    yield _sse({"type": "result", **result})
+
 
 @app.route('/')
-def index():
+def index() -> str:
     return render_template('index.html')
 
 @app.route('/generate_mesa', methods=['POST'])
-def generate_mesa_endpoint():
+def generate_mesa_endpoint() -> ResponseReturnValue:
     data = request.get_json()
     if not data or 'prompt' not in data:
         return jsonify({"error": "Request body must be JSON and contain a 'prompt' field."}), 400
@@ -23,6 +102,7 @@ def generate_mesa_endpoint():
     user_prompt = data['prompt']
     model_params = data.get('model_params', None) # Optional model parameters
     steps_to_run = data.get('steps_to_run', 1) # Optional, defaults to 1 step
+    reset = data.get('reset') is True # Optional, start a new model instead of continuing a cached one
     try:
         steps_to_run = int(steps_to_run)
         if steps_to_run <= 0:
@@ -30,39 +110,28 @@ def generate_mesa_endpoint():
     except ValueError:
         steps_to_run = 1 # Default if non-integer provided
 
+    log.info("Received prompt: %s", user_prompt)
+
+    # Stream the code as it is generated when asked to, as Server-Sent Events
+    if data.get('stream') is True or request.accept_mimetypes.best_match(
+        ["application/json", "text/event-stream"]
+    ) == "text/event-stream":
+        return app.response_class(
+            stream_with_context(_stream_generation(user_prompt, model_params, steps_to_run, reset)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
     # 1. Call OpenAI Interface
     # Note: Actual OpenAI API call is still placeholder in openai_interface.py
     # You'll need to set your OPENAI_API_KEY in a .env file for the real calls.
-    print(f"Received prompt: {user_prompt}")
     mesa_code_str = openai_interface.get_mesa_code(user_prompt)
     
     if mesa_code_str.startswith("# Error") or mesa_code_str.startswith("# No prompt"):
         return jsonify({"error": "Failed to generate Mesa code from prompt.", "details": mesa_code_str}), 500
 
-    print("--- Generated Mesa Code (Placeholder) ---")
-    print(mesa_code_str)
-    print("--------------------------------------")
-
     # 2. Call Mesa Runner
-    # WARNING: This uses exec() and is insecure. For development/MVP only.
-    print(f"Attempting to run Mesa code with params: {model_params}, steps: {steps_to_run}...")
-    simulation_result = mesa_runner.run_mesa_code(
-        mesa_code_str, 
-        model_params=model_params,
-        steps_to_run=steps_to_run
-    )
-    print("--- Simulation Result ---")
-    print(simulation_result)
-    print("-------------------------")
-
-    return jsonify({
-        "message": "Mesa code generation and execution attempt complete.",
-        "user_prompt": user_prompt,
-        "generated_code_preview": mesa_code_str.splitlines()[:15], # Preview first 15 lines
-        "simulation_output": simulation_result.get("output"),
-        "simulation_success": simulation_result.get("success"),
-        "simulation_error": simulation_result.get("error")
-    })
+    return jsonify(_run_generated(user_prompt, mesa_code_str, model_params, steps_to_run, reset))
 
 if __name__ == '__main__':
     # Ensure OPENAI_API_KEY is loaded if you uncomment the actual API calls
@@ -72,4 +141,9 @@ if __name__ == '__main__':
     #     print("Please create a .env file with your OPENAI_API_KEY.")
         # exit(1) # Or handle more gracefully
 
-    app.run(debug=True, port=5001)
+    # Debug mode (reloader + interactive debugger) only when FLASK_DEV is set.
+    # Requests are served one at a time because run_mesa_code captures output
+    # by redirecting the process-wide stdout; use gunicorn.conf.py for more
+    # throughput.
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    app.run(debug=bool(os.environ.get("FLASK_DEV")), port=5001, threaded=False)
@@ -0,0 +1,19 @@
+# Gunicorn settings for the Mesa generator app:
+#   gunicorn -c gunicorn.conf.py app:app
+import logging
+import multiprocessing
+import os
+
+bind = os.getenv("MESA_APP_BIND", "127.0.0.1:5001")
+# run_mesa_code captures output by redirecting the process-wide sys.stdout,
+# so concurrency comes from worker processes with one request each rather
+# than from threads or greenlets sharing a process.
+workers = int(os.getenv("MESA_APP_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "sync"
+# An LLM call plus a simulation run can take well over the default 30 seconds
+timeout = 300
+# Application log level; workers inherit this configuration from the master
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s"
+)
@@ -1,6 +1,17 @@
-import sys
+import builtins
 import io
 import contextlib
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import types
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+log = logging.getLogger(__name__)
 
 # !!! SECURITY WARNING !!!
 # Executing arbitrary code from an LLM using exec() is highly insecure.
@@ -8,16 +19,174 @@ import contextlib
 # sandboxed execution environment for any production or shared use.
 # Consider Docker containers, RestrictedPython, or other isolation mechanisms.
 
-def run_mesa_code(mesa_code_str: str, model_params=None, steps_to_run: int = 1):
+# Compiled code objects for recently run sources, keyed by a hash of the source,
+# so re-running the same generated code skips parsing and compiling it again.
+_CODE_CACHE_SIZE = 64
+_CODE_CACHE: "OrderedDict[bytes, types.CodeType]" = OrderedDict()
+
+# Live model instances keyed by (source hash, model params), so later calls with
+# the same code and params keep stepping the same simulation.
+_MODEL_CACHE_SIZE = 16
+_MODEL_CACHE: "OrderedDict[tuple, object]" = OrderedDict()
+
+def _source_key(mesa_code_str: str) -> bytes:
+    """Returns the cache key for a Mesa code string."""
+    return hashlib.blake2b(mesa_code_str.encode("utf-8"), digest_size=16).digest()
+
+def _compile_cached(mesa_code_str: str) -> types.CodeType:
+    """
+    Compiles a Mesa code string, reusing the code object from earlier runs of the same source.
+
+    Raises:
+        SyntaxError: If the code string is not valid Python.
+    """
+    key = _source_key(mesa_code_str)
+    code_obj = _CODE_CACHE.get(key)
+    if code_obj is None:
+        code_obj = compile(mesa_code_str, "<generated_mesa_code>", "exec")
+        _CODE_CACHE[key] = code_obj
+        if len(_CODE_CACHE) > _CODE_CACHE_SIZE:
+            _CODE_CACHE.popitem(last=False)
+    else:
+        _CODE_CACHE.move_to_end(key)
+    return code_obj
+
+class _CappedOutput:
+    """
+    stdout replacement that keeps at most max_chars of output.
+
+    Generated models often print for every agent on every step; once the cap
+    is reached further writes are dropped instead of growing the buffer.
+    """
+    __slots__ = ("_buffer", "_remaining", "truncated")
+
+    def __init__(self, max_chars: int):
+        self._buffer = io.StringIO()
+        self._remaining = max_chars
+        self.truncated = False
+
+    def write(self, s: str) -> int:
+        if self._remaining > 0:
+            if len(s) > self._remaining:
+                self._buffer.write(s[:self._remaining])
+                self._remaining = 0
+                self.truncated = True
+            else:
+                self._buffer.write(s)
+                self._remaining -= len(s)
+        elif s:
+            self.truncated = True
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        value = self._buffer.getvalue()
+        if self.truncated:
+            value += "\n[Output truncated]\n"
+        return value
+
+def _params_key(model_params: dict) -> str:
+    """Returns a hashable, order-independent key for a model_params dict."""
+    return json.dumps(model_params, sort_keys=True, default=repr)
+
+def _remember_model(key: tuple, model_instance: Any) -> None:
+    """Keeps a live model for later calls, evicting the least recently used one."""
+    _MODEL_CACHE[key] = model_instance
+    _MODEL_CACHE.move_to_end(key)
+    if len(_MODEL_CACHE) > _MODEL_CACHE_SIZE:
+        _MODEL_CACHE.popitem(last=False)
+
+def _instantiate_model(mesa_code_str: str, exec_globals: dict, model_params: dict) -> Any:
+    """
+    Executes the Mesa code string in exec_globals and instantiates its model class.
+
+    Raises:
+        NameError: If no Mesa model class is defined by the code.
+        Exception: If the model cannot be instantiated.
+    """
+    # Attempt to find and instantiate the Mesa model class.
+    # This assumes the LLM names the main model class 'MyModel' or similar.
+    # A more robust solution would be to parse the code or have the LLM
+    # specify the main model class name.
+    # Ensure 'mesa' (the module object) is available for issubclass check
+    # It is in exec_globals from the pre-import in run_mesa_code.
+    mesa_module_in_scope = exec_globals.get('mesa')
+    base_model = getattr(mesa_module_in_scope, 'Model', None)
+
+    # Record Mesa model subclasses as their class statements run, instead of
+    # scanning every name in exec_globals afterwards. Class statements look up
+    # __build_class__ in the builtins of the executing globals.
+    found_models = []
+
+    def build_class(func: Callable[..., Any], name: str, *args: Any, **kwargs: Any) -> Any:
+        cls = builtins.__build_class__(func, name, *args, **kwargs)
+        if base_model is not None and isinstance(cls, type) and \
+           issubclass(cls, base_model) and cls is not base_model:
+            found_models.append(cls)
+        return cls
+
+    exec_globals['__builtins__'] = {**builtins.__dict__, '__build_class__': build_class}
+
+    # Execute the Mesa code string. This defines classes and functions in exec_globals
+    exec(_compile_cached(mesa_code_str), exec_globals)
+
+    ModelClass = None
+    if base_model is None:
+        print("Warning: mesa or mesa.Model not found in exec_globals. Cannot identify model class.")
+    elif found_models:
+        # We'll take the first one defined.
+        # If multiple are defined by LLM, this might need refinement.
+        ModelClass = found_models[0]
+        for other in found_models[1:]:
+            # More than one model class found, this is ambiguous for now.
+            # Could be handled by asking LLM to name the main one "MainModel" or similar.
+            print(f"Warning: Multiple Mesa model classes found. Using the first one: {ModelClass.__name__}. Found another: {other.__name__}")
+    else:
+        # The code may import its model class rather than define it
+        for obj in exec_globals.values():
+            if isinstance(obj, type) and issubclass(obj, base_model) and obj is not base_model:
+                ModelClass = obj
+                break
+
+    if not ModelClass:
+        raise NameError("Could not find a suitable Mesa model class (e.g., 'MyModel') in the generated code.")
+
+    # Instantiate the model
+    # This needs to be flexible based on what parameters the LLM-generated model expects.
+    # For the placeholder, it expects 'N'.
+    try:
+        # Try to instantiate with known placeholder params
+        return ModelClass(**model_params)
+    except TypeError as te:
+        # Fallback if N is not expected or other params are missing
+        print(f"Warning: Could not instantiate model with default params {model_params}. Error: {te}")
+        print("Attempting to instantiate without params (this might fail).")
+        try:
+            return ModelClass()
+        except Exception as e_fallback:
+            raise Exception(f"Failed to instantiate model with default or no params: {e_fallback}")
+
+def run_mesa_code(mesa_code_str: str, model_params: Optional[dict] = None, steps_to_run: int = 1, reset: bool = False,
+                  max_output_chars: int = 1_000_000) -> dict:
     """
     Executes the provided Mesa Python code string and attempts to run the model.
     Captures stdout from the execution.
 
+    The model instance is kept between calls, so calling again with the same
+    code and model_params continues stepping the same simulation instead of
+    starting a new one.
+
     Args:
         mesa_code_str (str): A string containing the Python Mesa code.
         model_params (dict, optional): Parameters to pass to the Mesa model constructor.
                                        Defaults to {"N": 5} if not provided or if None.
         steps_to_run (int, optional): Number of steps to run the simulation. Defaults to 1.
+        reset (bool, optional): Start a new model instance even if one exists. Defaults to False.
+        max_output_chars (int, optional): Maximum number of characters of stdout to keep;
+                                          later output is dropped. 0 discards all output.
+                                          Defaults to 1,000,000.
 
     Returns:
         dict: A dictionary containing:
@@ -28,10 +197,13 @@ def run_mesa_code(mesa_code_str: str, model_params=None, steps_to_run: int = 1):
     if model_params is None:
         model_params = {"N": 5} # Default params for placeholder
 
-    output_buffer = io.StringIO()
+    output_buffer = _CappedOutput(max_output_chars)
     error_message = None
     success = False
 
+    model_key = (_source_key(mesa_code_str), _params_key(model_params))
+    model_instance = None if reset else _MODEL_CACHE.get(model_key)
+
     # Create a global scope for exec to run in
     exec_globals = {}
 
@@ -61,70 +233,29 @@ def run_mesa_code(mesa_code_str: str, model_params=None, steps_to_run: int = 1):
     try:
         # Redirect stdout to capture print statements from the Mesa code
         with contextlib.redirect_stdout(output_buffer):
-            # Execute the Mesa code string. This defines classes and functions in exec_globals
-            exec(mesa_code_str, exec_globals)
-
-            # Attempt to find and instantiate the Mesa model class.
-            # This assumes the LLM names the main model class 'MyModel' or similar.
-            # A more robust solution would be to parse the code or have the LLM
-            # specify the main model class name.
-            ModelClass = None
-            # Ensure 'mesa' (the module object) is available for issubclass check
-            # It should be in exec_globals from the pre-import or from 'import mesa' in LLM code.
-            mesa_module_in_scope = exec_globals.get('mesa')
-
-            if mesa_module_in_scope and hasattr(mesa_module_in_scope, 'Model'):
-                for name, obj in exec_globals.items():
-                    # Check if obj is a class, is a subclass of mesa.Model, and is not mesa.Model itself
-                    if isinstance(obj, type) and \
-                       issubclass(obj, mesa_module_in_scope.Model) and \
-                       obj is not mesa_module_in_scope.Model:
-                        if ModelClass is not None:
-                            # More than one model class found, this is ambiguous for now.
-                            # Could be handled by asking LLM to name the main one "MainModel" or similar.
-                            print(f"Warning: Multiple Mesa model classes found. Using the first one: {ModelClass.__name__}. Found another: {name}")
-                        else:
-                            ModelClass = obj
-                            # print(f"DEBUG: Found Mesa model class: {name}") # Removed for cleanup
-                            # We'll take the first one we find.
-                            # If multiple are defined by LLM, this might need refinement.
+            if model_instance is not None:
+                _MODEL_CACHE.move_to_end(model_key)
+                print("Continuing the existing model instance.")
             else:
-                print("Warning: mesa or mesa.Model not found in exec_globals. Cannot identify model class.")
-
-            if ModelClass:
-                # Instantiate the model
-                # This needs to be flexible based on what parameters the LLM-generated model expects.
-                # For the placeholder, it expects 'N'.
-                try:
-                    # Try to instantiate with known placeholder params
-                    model_instance = ModelClass(**model_params)
-                except TypeError as te:
-                    # Fallback if N is not expected or other params are missing
-                    print(f"Warning: Could not instantiate model with default params {model_params}. Error: {te}")
-                    print("Attempting to instantiate without params (this might fail).")
-                    try:
-                        model_instance = ModelClass()
-                    except Exception as e_fallback:
-                        raise Exception(f"Failed to instantiate model with default or no params: {e_fallback}")
-
-
-                # Run the specified number of steps for the model
-                # This assumes the model has a 'step()' method.
-                if hasattr(model_instance, 'step') and callable(model_instance.step):
-                    print(f"Attempting to run model for {steps_to_run} step(s)...")
-                    for i in range(steps_to_run):
-                        print(f"--- Runner: Model Step {i + 1}/{steps_to_run} ---")
-                        model_instance.step()
-                    success = True
-                    print("Model simulation steps completed by runner.")
-                else:
-                    raise AttributeError("Generated model class does not have a callable 'step' method.")
+                model_instance = _instantiate_model(mesa_code_str, exec_globals, model_params)
+                _remember_model(model_key, model_instance)
+
+            # Run the specified number of steps for the model
+            # This assumes the model has a 'step()' method.
+            if hasattr(model_instance, 'step') and callable(model_instance.step):
+                print(f"Attempting to run model for {steps_to_run} step(s)...")
+                for i in range(steps_to_run):
+                    print(f"--- Runner: Model Step {i + 1}/{steps_to_run} ---")
+                    model_instance.step()
+                success = True
+                print("Model simulation steps completed by runner.")
             else:
-                raise NameError("Could not find a suitable Mesa model class (e.g., 'MyModel') in the generated code.")
+                _MODEL_CACHE.pop(model_key, None)
+                raise AttributeError("Generated model class does not have a callable 'step' method.")
 
     except Exception as e:
         error_message = f"Error during Mesa code execution: {type(e).__name__}: {e}"
-        print(error_message, file=sys.stderr) # Also print to actual stderr for Flask logs
+        log.exception(error_message) # Also log outside the captured output for Flask logs
         success = False
     
     captured_output = output_buffer.getvalue()
@@ -134,6 +265,81 @@ def run_mesa_code(mesa_code_str: str, model_params=None, steps_to_run: int = 1):
         "error": error_message
     }
 
+# --- Out-of-process execution ---
+# With MESA_RUNNER_WORKERS > 0, app.py runs generated code in worker processes
+# (see run_mesa_code_in_worker) so it cannot block or leak into the web server.
+# Each worker is its own single-process pool and a given code/params pair is
+# always sent to the same one, so its cached model keeps stepping there.
+WORKERS = int(os.getenv("MESA_RUNNER_WORKERS", "0"))
+WORKER_TIMEOUT = float(os.getenv("MESA_RUNNER_TIMEOUT", "30"))
+WORKER_MEMORY_MB = int(os.getenv("MESA_RUNNER_MEMORY_MB", "1024"))
+# Workers are replaced after this many runs to bound leaks from generated code
+WORKER_MAX_TASKS = 50
+
+_pools: list = []
+_pools_lock = threading.Lock()
+
+def _init_worker(memory_mb: int) -> None:
+    """Limits a worker's address space and imports mesa once for all of its runs."""
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass # Not available on this platform
+    try:
+        import mesa
+    except ImportError:
+        pass # run_mesa_code reports this
+
+def _new_pool() -> Any:
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    return ctx.Pool(
+        processes=1,
+        initializer=_init_worker,
+        initargs=(WORKER_MEMORY_MB,),
+        maxtasksperchild=WORKER_MAX_TASKS
+    )
+
+def run_mesa_code_in_worker(mesa_code_str: str, model_params: Optional[dict] = None, steps_to_run: int = 1,
+                            reset: bool = False, max_output_chars: int = 1_000_000) -> dict:
+    """
+    Runs run_mesa_code in a worker process, with a timeout and memory limit.
+
+    Takes the same arguments and returns the same dictionary as run_mesa_code.
+    A run that exceeds MESA_RUNNER_TIMEOUT seconds is killed along with its
+    worker, which loses that worker's cached models.
+    """
+    model_key = (_source_key(mesa_code_str), _params_key(model_params if model_params is not None else {"N": 5}))
+    with _pools_lock:
+        if not _pools:
+            _pools.extend(_new_pool() for _ in range(max(1, WORKERS)))
+        slot = hash(model_key) % len(_pools)
+        pool = _pools[slot]
+
+    pending = pool.apply_async(
+        run_mesa_code,
+        (mesa_code_str, model_params, steps_to_run, reset, max_output_chars)
+    )
+    try:
+        return pending.get(timeout=WORKER_TIMEOUT)
+    except multiprocessing.TimeoutError:
+        pool.terminate()
+        with _pools_lock:
+            if _pools[slot] is pool:
+                _pools[slot] = _new_pool()
+        error_message = f"Error during Mesa code execution: TimeoutError: run exceeded {WORKER_TIMEOUT} seconds"
+    except Exception as e:
+        # e.g. the worker died after exceeding its memory limit
+        error_message = f"Error during Mesa code execution: {type(e).__name__}: {e}"
+    log.error(error_message)
+    return {
+        "success": False,
+        "output": "",
+        "error": error_message
+    }
+
 if __name__ == '__main__':
     # Example usage for testing this module directly
     test_code = """
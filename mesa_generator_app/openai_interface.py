@@ -1,91 +1,618 @@
+import asyncio
+import json
+import logging
+import math
+import operator
 import os
-from openai import OpenAI
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, Optional, Tuple
+from openai import OpenAI, AsyncOpenAI
+try:
+    import httpx
+except ImportError:
+    httpx = None
 from dotenv import load_dotenv
 
+log = logging.getLogger(__name__)
+
 # Load environment variables from .env file at the module level
 # This ensures OPENAI_API_KEY is available when the client is initialized.
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+
+def _http_client_options() -> dict:
+    """Connection pool settings for the OpenAI clients' httpx transport.
+
+    A larger keep-alive pool lets bursts of concurrent generations reuse
+    connections instead of paying a TCP and TLS handshake each, and HTTP/2
+    (when the h2 package is installed) multiplexes them over one connection.
+    """
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    return {
+        "http2": http2,
+        "limits": httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        # Reasoning models can take minutes; fail fast only when connecting
+        "timeout": httpx.Timeout(300.0, connect=5.0)
+    }
+
+
 if not OPENAI_API_KEY:
-    print("CRITICAL: OPENAI_API_KEY not found in environment variables.")
-    print("Please ensure a .env file exists in the 'mesa_generator_app' directory and contains your OPENAI_API_KEY.")
+    log.critical("OPENAI_API_KEY not found in environment variables. "
+                 "Please ensure a .env file exists in the 'mesa_generator_app' directory and contains your OPENAI_API_KEY.")
     # In a real app, you might raise an exception or have a fallback.
     # For now, the client initialization will fail if the key is missing.
     client = None 
 else:
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        if httpx is not None:
+            client = OpenAI(api_key=OPENAI_API_KEY, http_client=httpx.Client(**_http_client_options()))
+        else:
+            client = OpenAI(api_key=OPENAI_API_KEY)
     except Exception as e:
-        print(f"Error initializing OpenAI client: {e}")
+        log.error("Error initializing OpenAI client: %s", e)
         client = None
 
+# Generated code for recent (model_name, prompt) pairs, so a repeated prompt
+# skips the API call. Set MESA_PROMPT_CACHE_DB to a file path to keep entries
+# across restarts and share them between worker processes.
+_PROMPT_CACHE_SIZE = 512
+_PROMPT_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_prompt_cache_lock = threading.Lock()
+_prompt_cache_db = None
+if os.getenv("MESA_PROMPT_CACHE_DB"):
+    _prompt_cache_db = sqlite3.connect(os.getenv("MESA_PROMPT_CACHE_DB"), check_same_thread=False)
+    _prompt_cache_db.execute("PRAGMA journal_mode=WAL")
+    _prompt_cache_db.execute(
+        "CREATE TABLE IF NOT EXISTS mesa_code_cache "
+        "(model TEXT NOT NULL, prompt TEXT NOT NULL, code TEXT NOT NULL, PRIMARY KEY (model, prompt))"
+    )
+    _prompt_cache_db.commit()
 
-def get_mesa_code(user_prompt: str, model_name: str = "o4-mini-2025-04-16") -> str:
-    """
-    Takes a user's natural language prompt and returns Mesa Python code
-    by calling the OpenAI API.
+
+def _cached_code(key: tuple) -> Optional[str]:
+    """Returns cached code for a (model_name, prompt) key, or None."""
+    with _prompt_cache_lock:
+        code = _PROMPT_CACHE.get(key)
+        if code is not None:
+            _PROMPT_CACHE.move_to_end(key)
+            return code
+        if _prompt_cache_db is not None:
+            row = _prompt_cache_db.execute(
+                "SELECT code FROM mesa_code_cache WHERE model = ? AND prompt = ?", key
+            ).fetchone()
+            if row:
+                _remember_code(key, row[0])
+                return row[0]
+    return None
+
+
+def _remember_code(key: tuple, code: str) -> None:
+    """Adds code to the in-memory cache; caller holds _prompt_cache_lock."""
+    _PROMPT_CACHE[key] = code
+    _PROMPT_CACHE.move_to_end(key)
+    if len(_PROMPT_CACHE) > _PROMPT_CACHE_SIZE:
+        _PROMPT_CACHE.popitem(last=False)
+
+
+def _store_code(key: tuple, code: str) -> None:
+    """Caches generated code for a (model_name, prompt) key."""
+    with _prompt_cache_lock:
+        _remember_code(key, code)
+        if _prompt_cache_db is not None:
+            _prompt_cache_db.execute(
+                "INSERT OR REPLACE INTO mesa_code_cache (model, prompt, code) VALUES (?, ?, ?)",
+                (*key, code)
+            )
+            _prompt_cache_db.commit()
+
+
+# Semantic cache: paraphrases of an earlier prompt ("5 agents moving randomly"
+# vs "five random-walking agents") reuse its code when the cosine similarity
+# of their embeddings reaches MESA_SEMANTIC_CACHE_THRESHOLD. Off unless the
+# threshold is set, since every cache miss then costs an embeddings call.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("MESA_SEMANTIC_CACHE_THRESHOLD", "0") or 0)
+EMBEDDING_MODEL = os.getenv("MESA_EMBEDDING_MODEL", "text-embedding-3-small")
+# (model_name, unit-length prompt embedding, code), oldest first
+_SEMANTIC_ENTRIES: list = []
+
+
+def _embed(text: str) -> Optional[list]:
+    """Returns the unit-length embedding of text, or None if the call fails."""
+    try:
+        response = client.embeddings.create(model=EMBEDDING_MODEL, input=text)
+    except Exception as e:
+        log.warning("Embedding request failed, skipping semantic cache: %s", e)
+        return None
+    vector = response.data[0].embedding
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _semantic_lookup(model_name: str, vector: list) -> Optional[str]:
+    """Returns code for the most similar cached prompt above the threshold, or None."""
+    best_score, best_code = SEMANTIC_CACHE_THRESHOLD, None
+    with _prompt_cache_lock:
+        entries = list(_SEMANTIC_ENTRIES)
+    for entry_model, entry_vector, code in entries:
+        if entry_model != model_name:
+            continue
+        score = sum(map(operator.mul, vector, entry_vector))
+        if score >= best_score:
+            best_score, best_code = score, code
+    if best_code is not None:
+        log.info("Using cached Mesa code for a similar prompt (cosine %.3f).", best_score)
+    return best_code
+
+
+def _semantic_store(model_name: str, vector: list, code: str) -> None:
+    """Adds a prompt embedding and its code to the semantic cache."""
+    with _prompt_cache_lock:
+        _SEMANTIC_ENTRIES.append((model_name, vector, code))
+        if len(_SEMANTIC_ENTRIES) > _PROMPT_CACHE_SIZE:
+            del _SEMANTIC_ENTRIES[0]
+
+
+# Sent unchanged on every call; kept terse since every token is prefilled each
+# time. It is well under the 1024 tokens OpenAI needs before it caches a prompt
+# prefix, so it is never served from the provider's prompt cache.
+_SYSTEM_PROMPT = """You write complete, runnable Mesa 2.2 Python scripts from simulation descriptions.
+- Imports: `import mesa` (+ mesa.time, mesa.space, mesa.DataCollector as needed).
+- Agents: subclass mesa.Agent with __init__ and step().
+- Model: subclass mesa.Model; __init__ sets parameters, agents and a scheduler (e.g. mesa.time.RandomActivation(self)); step() advances one step, typically self.schedule.step().
+- Model __init__ parameters are keyword arguments with defaults, e.g. def __init__(self, N=10, width=10, height=10).
+- Grids: mesa.space.MultiGrid or SingleGrid, created in __init__ with agents placed on it.
+- Use mesa.DataCollector if the description implies tracking data.
+- One script, no `if __name__ == '__main__':` block; the runner instantiates and steps the model.
+- Output raw Python only, no markdown fences."""
+
+
+# Descriptions are routed to a fast model unless they look like they need the
+# reasoning model; passing model_name explicitly skips the routing.
+FAST_MODEL = os.getenv("MESA_FAST_MODEL", "gpt-4o-mini")
+REASONING_MODEL = os.getenv("MESA_REASONING_MODEL", "o4-mini-2025-04-16")
+# Simple models fit comfortably; the cap cuts off runaway responses
+FAST_MODEL_MAX_TOKENS = 1500
+# Most prompts packed into one get_mesa_code_batch request, so that their
+# combined output (10 x FAST_MODEL_MAX_TOKENS) stays within gpt-4o-mini's
+# 16,384 token output limit
+BATCH_MAX_PROMPTS = int(os.getenv("MESA_BATCH_MAX_PROMPTS", "10"))
+_COMPLEX_HINTS = ("schelling", "grid", "datacollector", "data collector", "track", "network",
+                  "predator", "prey", "wealth", "economy", "epidemic", "infect")
+_TRUNCATED_ERROR = "# Error generating code from OpenAI: response hit the token limit."
+
+
+def _classify_complexity(user_prompt: str) -> str:
+    """Tags a description as "simple" or "complex" from its length and keywords."""
+    text = (user_prompt or "").lower()
+    if len(text.split()) > 40 or any(hint in text for hint in _COMPLEX_HINTS):
+        return "complex"
+    return "simple"
+
+
+def _choose_model(prompts: list, model_name: Optional[str]) -> str:
+    """Returns model_name if given, else the model suited to the most complex prompt."""
+    if model_name:
+        return model_name
+    if any(_classify_complexity(p) == "complex" for p in prompts):
+        return REASONING_MODEL
+    return FAST_MODEL
+
+
+def _model_params(model_name: str) -> dict:
+    """Extra completion parameters for a model; reasoning models only accept the defaults."""
+    if model_name == FAST_MODEL:
+        return {"temperature": 0, "max_completion_tokens": FAST_MODEL_MAX_TOKENS}
+    return {}
+
+
+def _build_messages(user_prompt: str) -> list:
+    """Builds the chat messages asking the model for Mesa code."""
+    return [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": f"Simulation description:\n---\n{user_prompt}\n---"}
+    ]
+
+
+def _log_usage(response: Any) -> None:
+    """Logs a completion's token counts."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    log.info("Token usage: %s prompt, %s completion.", usage.prompt_tokens, usage.completion_tokens)
+
+
+def _strip_fences(generated_code: str) -> str:
+    """Removes markdown code fences in case the model ignores the instruction."""
+    if generated_code.strip().startswith("```python"):
+        generated_code = generated_code.split("```python\n", 1)[-1]
+        if generated_code.strip().endswith("```"):
+            generated_code = generated_code.rsplit("\n```", 1)[0]
+    return generated_code.strip()
+
+
+# Common requests answered from templates without calling the API. Each entry
+# is (pattern, function building the code from the match); the pattern is
+# searched in the stripped prompt. Only short prompts are matched, since
+# longer ones usually ask for behaviour the template does not have.
+_TEMPLATE_MAX_WORDS = 30
+
+RANDOM_WALK_TEMPLATE = """import mesa
+
+
+class WalkerAgent(mesa.Agent):
+    \"\"\"An agent that moves to a random neighboring cell each step.\"\"\"
+
+    def __init__(self, unique_id, model):
+        super().__init__(unique_id, model)
+
+    def step(self):
+        neighbors = self.model.grid.get_neighborhood(self.pos, moore=True, include_center=False)
+        self.model.grid.move_agent(self, self.random.choice(neighbors))
+
+
+class RandomWalkModel(mesa.Model):
+    \"\"\"N agents moving randomly on a width x height grid.\"\"\"
+
+    def __init__(self, N={N}, width={width}, height={height}):
+        super().__init__()
+        self.num_agents = N
+        self.grid = mesa.space.MultiGrid(width, height, torus=True)
+        self.schedule = mesa.time.RandomActivation(self)
+        for i in range(self.num_agents):
+            agent = WalkerAgent(i, self)
+            self.schedule.add(agent)
+            x = self.random.randrange(self.grid.width)
+            y = self.random.randrange(self.grid.height)
+            self.grid.place_agent(agent, (x, y))
+
+    def step(self):
+        self.schedule.step()
+        print(f"Step {{self.schedule.steps}}: {{[agent.pos for agent in self.schedule.agents]}}")
+"""
+
+
+def _random_walk_code(match: "re.Match") -> Optional[str]:
+    """Fills RANDOM_WALK_TEMPLATE, or returns None for implausible sizes."""
+    n, width, height = int(match[1]), int(match[2]), int(match[3])
+    if not (0 < n <= 10_000 and 0 < width <= 1000 and 0 < height <= 1000):
+        return None
+    return RANDOM_WALK_TEMPLATE.format(N=n, width=width, height=height)
+
+
+_TEMPLATES = [
+    (re.compile(r"(\d+)\s+agents?\s+on\s+an?\s+(\d+)\s*x\s*(\d+)\s+grid\b.*?"
+                r"\b(?:mov\w*\s+(?:\w+\s+)?randomly|random(?:ly)?[- ]?walk)", re.IGNORECASE | re.DOTALL),
+     _random_walk_code),
+]
+
+
+def _template_code(user_prompt: str) -> Optional[str]:
+    """Returns template code for a prompt matching one of _TEMPLATES, or None."""
+    if len(user_prompt.split()) > _TEMPLATE_MAX_WORDS:
+        return None
+    for pattern, build in _TEMPLATES:
+        match = pattern.search(user_prompt)
+        if match is None:
+            continue
+        try:
+            code = build(match)
+        except Exception as e:
+            log.warning("Template %s failed, falling back to the API: %s", build.__name__, e)
+            continue
+        if code is not None:
+            return code
+    return None
+
+
+def _check_prompt(user_prompt: str, model_name: str) -> Tuple[Optional[str], Optional[tuple], Optional[list]]:
+    """Handles everything that can answer a prompt without generating code.
+
+    Returns:
+        (early, cache_key, prompt_vector): early is an error string, template
+        code or cached code to return as-is, otherwise None; prompt_vector is
+        the prompt's embedding when the semantic cache is enabled.
     """
-    if not client:
-        return "# Error: OpenAI client not initialized. Check API key."
-    if not OPENAI_API_KEY: # Double check, though client init should catch it
-        return "# Error: OPENAI_API_KEY is not set."
+    code = _template_code(user_prompt.strip()) if user_prompt else None
+    if code is not None:
+        log.info("Using template Mesa code for prompt.")
+        return code, None, None
     if not user_prompt:
-        return "# No prompt provided to generate Mesa code."
-
-    # --- Prompt Engineering Section ---
-    system_message_content = """You are an expert Python programmer specializing in the Mesa agent-based modeling framework.
-Your task is to take a user's description of a simulation and generate a complete, runnable Mesa Python script.
-
-The script should include:
-1.  All necessary imports, primarily `import mesa` and potentially `mesa.time`, `mesa.space`, `mesa.DataCollector`.
-2.  Relevant agent class(es) inheriting from `mesa.Agent`. Agents should have an `__init__` method and a `step()` method.
-3.  A model class inheriting from `mesa.Model`.
-4.  The model class should have an `__init__` method to set up agents, a scheduler (e.g., `mesa.time.RandomActivation(self)`), and any necessary parameters (e.g., number of agents, width, height for a grid).
-5.  The model class must have a `step()` method that advances the simulation by one step. This typically involves calling `self.schedule.step()`.
-6.  If the simulation involves a grid, use `mesa.space.MultiGrid` or `mesa.space.SingleGrid`. Initialize it in the model's `__init__` and place agents on it.
-7.  Consider including `mesa.DataCollector` if the user's prompt implies data collection needs (e.g., "track the number of happy agents").
-8.  The generated code should be a single Python script. Do NOT include any example run block like `if __name__ == '__main__':`. The runner script will handle instantiation and execution.
-9.  Do NOT use any markdown formatting (e.g., ```python ... ```) in your response. Return only the raw Python code.
-10. Ensure the model's `__init__` method can be called with keyword arguments if it takes parameters (e.g. `def __init__(self, N=10, width=10, height=10):`).
-"""
+        return "# No prompt provided to generate Mesa code.", None, None
 
-    user_message_content = f"""User's simulation description:
----
-{user_prompt}
----
+    cache_key = (model_name, user_prompt.strip())
+    cached = _cached_code(cache_key)
+    if cached is not None:
+        log.info("Using cached Mesa code for prompt.")
+        return cached, cache_key, None
 
-Please generate the Mesa Python code based on this description. Remember to only output the raw Python code.
-"""
+    # client is None exactly when OPENAI_API_KEY is missing or the client
+    # failed to initialize; templates and cached code work without it
+    if client is None:
+        return "# Error: OpenAI client not initialized. Check API key.", None, None
+
+    prompt_vector = None
+    if SEMANTIC_CACHE_THRESHOLD > 0:
+        prompt_vector = _embed(cache_key[1])
+        if prompt_vector is not None:
+            cached = _semantic_lookup(model_name, prompt_vector)
+            if cached is not None:
+                _store_code(cache_key, cached)
+                return cached, cache_key, prompt_vector
+    return None, cache_key, prompt_vector
+
+
+def _remember_generated(cache_key: tuple, prompt_vector: Optional[list], code: str) -> None:
+    """Caches freshly generated code in the exact and semantic caches."""
+    _store_code(cache_key, code)
+    if prompt_vector is not None:
+        _semantic_store(cache_key[0], prompt_vector, code)
+
+
+def get_mesa_code(user_prompt: str, model_name: Optional[str] = None) -> str:
+    """
+    Takes a user's natural language prompt and returns Mesa Python code
+    by calling the OpenAI API. Code for a prompt already generated with the
+    same model is returned from the cache without calling the API, as is
+    code for a paraphrased prompt when the semantic cache is enabled.
+    Without a model_name, simple descriptions go to FAST_MODEL and the rest
+    to REASONING_MODEL.
+    """
+    model_name = _choose_model([user_prompt], model_name)
+    early, cache_key, prompt_vector = _check_prompt(user_prompt, model_name)
+    if early is not None:
+        return early
+
+    messages = _build_messages(user_prompt)
 
     try:
-        print(f"Sending prompt to OpenAI API (model: {model_name})...")
+        log.info("Sending prompt to OpenAI API (model: %s)...", model_name)
         response = client.chat.completions.create(
             model=model_name,
-            messages=[
-                {"role": "system", "content": system_message_content},
-                {"role": "user", "content": user_message_content}
-            ]
-            # temperature=0.2 # Removed as it's not supported by the user's new model
-            # If a specific temperature is needed and supported, it can be re-added.
-            # For models that only support default temperature, omitting it is best.
+            messages=messages,
+            # temperature is only set for FAST_MODEL; the reasoning models
+            # support the default temperature only.
+            **_model_params(model_name)
         )
-        generated_code = response.choices[0].message.content
-
-        # Clean up potential markdown code fences if the LLM ignores the instruction
-        if generated_code.strip().startswith("```python"):
-            generated_code = generated_code.split("```python\n", 1)[-1]
-            if generated_code.strip().endswith("```"):
-                generated_code = generated_code.rsplit("\n```", 1)[0]
+        _log_usage(response)
+        if response.choices[0].finish_reason == "length":
+            # Cut-off code would not run; don't cache it
+            log.error("OpenAI response hit the token limit.")
+            return _TRUNCATED_ERROR
+        generated_code = _strip_fences(response.choices[0].message.content)
         
-        print("Successfully received code from OpenAI API.")
-        return generated_code.strip()
+        log.info("Successfully received code from OpenAI API.")
+        _remember_generated(cache_key, prompt_vector, generated_code)
+        return generated_code
         
     except Exception as e:
-        print(f"Error calling OpenAI API: {e}")
+        log.error("Error calling OpenAI API: %s", e)
         return f"# Error generating code from OpenAI: {e}"
 
+
+def get_mesa_code_stream(user_prompt: str, model_name: Optional[str] = None) -> Iterator[dict]:
+    """
+    Streaming variant of get_mesa_code, so callers can show code as the
+    model writes it instead of waiting for the whole completion.
+
+    Yields:
+        {"type": "delta", "content": str} for each piece of streamed text,
+        then one {"type": "code", "code": str} with the cleaned code, or with
+        the same "# Error ..." / "# No prompt ..." string get_mesa_code
+        would return. Cached code is yielded as the "code" event alone.
+    """
+    model_name = _choose_model([user_prompt], model_name)
+    early, cache_key, prompt_vector = _check_prompt(user_prompt, model_name)
+    if early is not None:
+        yield {"type": "code", "code": early}
+        return
+
+    try:
+        log.info("Streaming prompt to OpenAI API (model: %s)...", model_name)
+        stream = client.chat.completions.create(
+            model=model_name,
+            messages=_build_messages(user_prompt),
+            stream=True,
+            **_model_params(model_name),
+            # Usage arrives in a final chunk without choices
+            stream_options={"include_usage": True}
+        )
+        parts = []
+        finish_reason = None
+        for chunk in stream:
+            if not chunk.choices:
+                _log_usage(chunk)
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            content = chunk.choices[0].delta.content
+            if content:
+                parts.append(content)
+                yield {"type": "delta", "content": content}
+    except Exception as e:
+        log.error("Error calling OpenAI API: %s", e)
+        yield {"type": "code", "code": f"# Error generating code from OpenAI: {e}"}
+        return
+    if finish_reason == "length":
+        log.error("OpenAI response hit the token limit.")
+        yield {"type": "code", "code": _TRUNCATED_ERROR}
+        return
+
+    # Fences can only be recognised once the whole response is in
+    generated_code = _strip_fences("".join(parts))
+    log.info("Successfully streamed code from OpenAI API.")
+    _remember_generated(cache_key, prompt_vector, generated_code)
+    yield {"type": "code", "code": generated_code}
+
+async def get_mesa_code_async(prompts: list, model_name: Optional[str] = None,
+                              concurrency: int = 20) -> list:
+    """
+    Generates Mesa code for many prompts concurrently, so the batch takes
+    about as long as its slowest request instead of the sum of all of them.
+
+    Args:
+        prompts: Natural language simulation descriptions
+        model_name: OpenAI model to use; routed per prompt when not given
+        concurrency: Maximum number of requests in flight at once, to stay
+            within the account's rate limits
+
+    Returns:
+        Code for each prompt, aligned with prompts; failed prompts get the
+        same "# Error ..." / "# No prompt ..." strings as get_mesa_code
+    """
+    # Scoped to this call: an async connection pool is tied to the running
+    # event loop, and get_mesa_codes runs a new loop per call
+    async_client = None
+    if OPENAI_API_KEY:
+        if httpx is not None:
+            async_client = AsyncOpenAI(api_key=OPENAI_API_KEY,
+                                       http_client=httpx.AsyncClient(**_http_client_options()))
+        else:
+            async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(user_prompt: str) -> str:
+        model = _choose_model([user_prompt], model_name)
+        # Cache lookups may call the embeddings API; keep them off the event loop
+        early, cache_key, prompt_vector = await asyncio.to_thread(_check_prompt, user_prompt, model)
+        if early is not None:
+            return early
+        async with semaphore:
+            try:
+                response = await async_client.chat.completions.create(
+                    model=model,
+                    messages=_build_messages(user_prompt),
+                    **_model_params(model)
+                )
+            except Exception as e:
+                log.error("Error calling OpenAI API: %s", e)
+                return f"# Error generating code from OpenAI: {e}"
+        _log_usage(response)
+        if response.choices[0].finish_reason == "length":
+            log.error("OpenAI response hit the token limit.")
+            return _TRUNCATED_ERROR
+        generated_code = _strip_fences(response.choices[0].message.content)
+        _remember_generated(cache_key, prompt_vector, generated_code)
+        return generated_code
+
+    log.info("Sending %d prompts to OpenAI API...", len(prompts))
+    try:
+        return list(await asyncio.gather(*(one(p) for p in prompts)))
+    finally:
+        if async_client is not None:
+            await async_client.close()
+
+
+def get_mesa_codes(prompts: list, model_name: Optional[str] = None, concurrency: int = 20) -> list:
+    """
+    Synchronous wrapper around get_mesa_code_async.
+
+    When called from a thread that is already running an event loop (async
+    views, Jupyter, async workers), where asyncio.run would raise, the
+    requests run on a new loop in a worker thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(get_mesa_code_async(prompts, model_name, concurrency))
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, get_mesa_code_async(prompts, model_name, concurrency)).result()
+
+
+def get_mesa_code_batch(prompts: list, model_name: Optional[str] = None) -> list:
+    """
+    Generates Mesa code for several prompts in a single API call, so the
+    round trip and the system prompt are paid once for the whole batch.
+    Cached prompts are answered from the cache and left out of the request.
+    More than BATCH_MAX_PROMPTS uncached prompts are split over several
+    requests, to stay within the model's output limit. If a response cannot
+    be matched up with its prompts, they are generated with separate
+    concurrent requests instead.
+
+    Returns:
+        Code for each prompt, aligned with prompts, with the same error
+        strings as get_mesa_code for prompts that fail
+    """
+    # One request means one model: the reasoning model if any prompt needs it
+    model_name = _choose_model(prompts, model_name)
+    results: list = [None] * len(prompts)
+    pending = []  # (index, cache_key, prompt_vector)
+    for i, user_prompt in enumerate(prompts):
+        early, cache_key, prompt_vector = _check_prompt(user_prompt, model_name)
+        if early is not None:
+            results[i] = early
+        else:
+            pending.append((i, cache_key, prompt_vector))
+
+    for start in range(0, len(pending), BATCH_MAX_PROMPTS):
+        chunk = pending[start:start + BATCH_MAX_PROMPTS]
+        codes = _request_batch(chunk, model_name)
+        if codes is None:
+            log.warning("Batched response did not match the prompts; generating them separately.")
+            codes = get_mesa_codes([prompts[i] for i, _, _ in chunk], model_name)
+            for (i, _, _), code in zip(chunk, codes):
+                results[i] = code
+            continue
+        for (i, cache_key, prompt_vector), code in zip(chunk, codes):
+            results[i] = _strip_fences(code)
+            _remember_generated(cache_key, prompt_vector, results[i])
+    return results
+
+
+def _request_batch(pending: list, model_name: str) -> Optional[list]:
+    """
+    Asks for the code of several uncached prompts in one request.
+
+    Args:
+        pending: (index, cache_key, prompt_vector) for each prompt, as
+            gathered by get_mesa_code_batch
+        model_name: OpenAI model to use
+
+    Returns:
+        The raw scripts, aligned with pending, or None if the request failed
+        or its reply does not line up with the prompts
+    """
+    numbered = "\n".join(
+        f"{n}. ---\n{cache_key[1]}\n---" for n, (_, cache_key, _) in enumerate(pending, 1)
+    )
+    batch_prompt = (
+        f"Write one separate script for each of these {len(pending)} simulation descriptions. "
+        'Reply with a JSON object {"scripts": [...]} holding the scripts as strings, in order.\n'
+        + numbered
+    )
+    params = _model_params(model_name)
+    if "max_completion_tokens" in params:
+        params["max_completion_tokens"] *= len(pending)
+    codes = None
+    try:
+        log.info("Sending %d prompts to OpenAI API in one request (model: %s)...", len(pending), model_name)
+        response = client.chat.completions.create(
+            model=model_name,
+            messages=[
+                {"role": "system", "content": _SYSTEM_PROMPT},
+                {"role": "user", "content": batch_prompt}
+            ],
+            response_format={"type": "json_object"},
+            **params
+        )
+        _log_usage(response)
+        codes = json.loads(response.choices[0].message.content).get("scripts")
+    except Exception as e:
+        log.error("Error in batched OpenAI API call: %s", e)
+
+    if not isinstance(codes, list) or len(codes) != len(pending) or not all(isinstance(c, str) for c in codes):
+        return None
+    return codes
+
+
 if __name__ == '__main__':
     # Example usage (for testing this module directly)
     # Ensure your .env file is in the mesa_generator_app directory and has OPENAI_API_KEY
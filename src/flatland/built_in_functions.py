@@ -2,7 +2,7 @@
 Built-in functions for FlatLand rule evaluation.
 """
 
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Set, Tuple
 
 
 class BuiltInFunctions:
@@ -46,6 +46,35 @@ class BuiltInFunctions:
             return True
         return False
     
+    @staticmethod
+    def fill_rect(state: Dict[str, Any], x0: int, y0: int, x1: int, y1: int, value: int) -> bool:
+        """
+        Set every cell in a rectangle, e.g. to lay out walls.
+        
+        Args:
+            state: Current state
+            x0: Left X coordinate (inclusive)
+            y0: Top Y coordinate (inclusive)
+            x1: Right X coordinate (inclusive)
+            y1: Bottom Y coordinate (inclusive)
+            value: New cell value
+            
+        Returns:
+            True if any cell was set, False if the rectangle lies outside the grid
+        """
+        grid = state.get("grid", {})
+        x0, x1 = max(min(x0, x1), 0), min(max(x0, x1), grid.get("width", 0) - 1)
+        y0, y1 = max(min(y0, y1), 0), min(max(y0, y1), grid.get("height", 0) - 1)
+        if x0 > x1 or y0 > y1:
+            return False
+        
+        # One slice assignment per row instead of a set_cell call per cell
+        span = [value] * (x1 - x0 + 1)
+        cells = grid["cells"]
+        for y in range(y0, y1 + 1):
+            cells[y][x0:x1 + 1] = span
+        return True
+    
     @staticmethod
     def get_entity_at(state: Dict[str, Any], x: int, y: int) -> Optional[Dict[str, Any]]:
         """
@@ -122,13 +151,60 @@ class BuiltInFunctions:
         return any(e.get("type") == entity_type for e in state.get("entities", []))
     
     @staticmethod
-    def check_adjacent(state: Dict[str, Any], type_str: str) -> bool:
+    def entity_types(state: Dict[str, Any]) -> Set[str]:
+        """
+        Collect the entity types present in state.
+        
+        Args:
+            state: Current state
+            
+        Returns:
+            Set of entity types, built in one pass so several types can be
+            checked without rescanning the entities
+        """
+        return {e.get("type") for e in state.get("entities", [])}
+    
+    @staticmethod
+    def positions_by_type(state: Dict[str, Any]) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Group entity positions by entity type.
+        
+        Args:
+            state: Current state
+            
+        Returns:
+            Mapping of entity type to the (x, y) positions of its entities,
+            built in one pass so spatial checks for a type only visit the
+            entities of that type
+        """
+        by_type: Dict[str, List[Tuple[int, int]]] = {}
+        for entity in state.get("entities", []):
+            if "position" in entity:
+                pos = entity["position"]
+                by_type.setdefault(entity.get("type"), []).append((pos[0], pos[1]))
+        return by_type
+    
+    @staticmethod
+    def _positions_of(state: Dict[str, Any], type_str: str,
+                      by_type: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> List[Tuple[int, int]]:
+        """Positions of the entities of a type, from by_type when it is given."""
+        if by_type is not None:
+            return by_type.get(type_str, [])
+        return [
+            (e["position"][0], e["position"][1]) for e in state.get("entities", [])
+            if e.get("type") == type_str and "position" in e
+        ]
+    
+    @staticmethod
+    def check_adjacent(state: Dict[str, Any], type_str: str,
+                       by_type: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> bool:
         """
         Check if entity is adjacent to type.
         
         Args:
             state: Current state
             type_str: Entity type to check for
+            by_type: Optional result of positions_by_type for state
             
         Returns:
             True if current entity is adjacent to entity of given type
@@ -138,16 +214,13 @@ class BuiltInFunctions:
             return False
             
         x, y = current["position"]
-        # Check all four directions
-        directions = [(0,1), (1,0), (0,-1), (-1,0)]
-        for dx, dy in directions:
-            entity = BuiltInFunctions.get_entity_at(state, x+dx, y+dy)
-            if entity and entity.get("type") == type_str:
-                return True
-        return False
+        # Check all four directions in a single pass over the entities
+        neighbors = {(x, y+1), (x+1, y), (x, y-1), (x-1, y)}
+        return not neighbors.isdisjoint(BuiltInFunctions._positions_of(state, type_str, by_type))
     
     @staticmethod
-    def check_distance(state: Dict[str, Any], type_str: str, max_dist: int) -> bool:
+    def check_distance(state: Dict[str, Any], type_str: str, max_dist: int,
+                       by_type: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> bool:
         """
         Manhattan distance check to nearest entity of type.
         
@@ -155,6 +228,7 @@ class BuiltInFunctions:
             state: Current state
             type_str: Entity type to check for
             max_dist: Maximum distance
+            by_type: Optional result of positions_by_type for state
             
         Returns:
             True if entity of given type is within distance
@@ -164,11 +238,9 @@ class BuiltInFunctions:
             return False
             
         x1, y1 = current["position"]
-        for other in state.get("entities", []):
-            if other.get("type") == type_str and "position" in other:
-                x2, y2 = other["position"]
-                if abs(x2-x1) + abs(y2-y1) <= max_dist:
-                    return True
+        for x2, y2 in BuiltInFunctions._positions_of(state, type_str, by_type):
+            if abs(x2-x1) + abs(y2-y1) <= max_dist:
+                return True
         return False
     
     @staticmethod
@@ -218,7 +290,8 @@ class BuiltInFunctions:
         return grid["cells"][y][x] in [0, 4]
     
     @staticmethod
-    def count_entities(state: Dict[str, Any], type_str: str, radius: int) -> int:
+    def count_entities(state: Dict[str, Any], type_str: str, radius: int,
+                       by_type: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> int:
         """
         Count entities of type within radius.
         
@@ -226,6 +299,7 @@ class BuiltInFunctions:
             state: Current state
             type_str: Entity type to count
             radius: Maximum distance
+            by_type: Optional result of positions_by_type for state
             
         Returns:
             Number of entities of given type within radius
@@ -236,11 +310,9 @@ class BuiltInFunctions:
             
         count = 0
         x1, y1 = current["position"]
-        for other in state.get("entities", []):
-            if other.get("type") == type_str and "position" in other:
-                x2, y2 = other["position"]
-                if abs(x2-x1) + abs(y2-y1) <= radius:
-                    count += 1
+        for x2, y2 in BuiltInFunctions._positions_of(state, type_str, by_type):
+            if abs(x2-x1) + abs(y2-y1) <= radius:
+                count += 1
         return count
     
     @staticmethod
@@ -271,7 +343,8 @@ class BuiltInFunctions:
         return cell_below in [1, 3]  # Wall or box
     
     @staticmethod
-    def can_see(state: Dict[str, Any], type_str: str, max_dist: int) -> bool:
+    def can_see(state: Dict[str, Any], type_str: str, max_dist: int,
+                by_type: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> bool:
         """
         Check if entity has line of sight to another entity.
         
@@ -279,6 +352,7 @@ class BuiltInFunctions:
             state: Current state
             type_str: Entity type to check for
             max_dist: Maximum distance
+            by_type: Optional result of positions_by_type for state
             
         Returns:
             True if entity has line of sight to entity of given type
@@ -290,46 +364,45 @@ class BuiltInFunctions:
         x1, y1 = current["position"]
         grid = state.get("grid", {})
         
-        for other in state.get("entities", []):
-            if other.get("type") == type_str and "position" in other:
-                x2, y2 = other["position"]
-                
-                # Check distance
-                dist = abs(x2 - x1) + abs(y2 - y1)
-                if dist > max_dist:
-                    continue
-                
-                # Check line of sight (simplified)
-                if x1 == x2:  # Vertical line
-                    start_y, end_y = min(y1, y2), max(y1, y2)
-                    has_los = True
-                    for y in range(start_y + 1, end_y):
-                        if grid["cells"][y][x1] == 1:  # Wall
-                            has_los = False
-                            break
-                    if has_los:
-                        return True
-                        
-                elif y1 == y2:  # Horizontal line
-                    start_x, end_x = min(x1, x2), max(x1, x2)
-                    has_los = True
-                    for x in range(start_x + 1, end_x):
-                        if grid["cells"][y1][x] == 1:  # Wall
-                            has_los = False
-                            break
-                    if has_los:
-                        return True
+        for x2, y2 in BuiltInFunctions._positions_of(state, type_str, by_type):
+            # Check distance
+            dist = abs(x2 - x1) + abs(y2 - y1)
+            if dist > max_dist:
+                continue
+            
+            # Check line of sight (simplified)
+            if x1 == x2:  # Vertical line
+                start_y, end_y = min(y1, y2), max(y1, y2)
+                has_los = True
+                for y in range(start_y + 1, end_y):
+                    if grid["cells"][y][x1] == 1:  # Wall
+                        has_los = False
+                        break
+                if has_los:
+                    return True
+                    
+            elif y1 == y2:  # Horizontal line
+                start_x, end_x = min(x1, x2), max(x1, x2)
+                has_los = True
+                for x in range(start_x + 1, end_x):
+                    if grid["cells"][y1][x] == 1:  # Wall
+                        has_los = False
+                        break
+                if has_los:
+                    return True
         
         return False
     
     @staticmethod
-    def count_entities_on_goals(state: Dict[str, Any], type_str: str) -> int:
+    def count_entities_on_goals(state: Dict[str, Any], type_str: str,
+                                by_type: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> int:
         """
         Count entities of type on goal cells.
         
         Args:
             state: Current state
             type_str: Entity type to count
+            by_type: Optional result of positions_by_type for state
             
         Returns:
             Number of entities of given type on goal cells
@@ -337,11 +410,9 @@ class BuiltInFunctions:
         count = 0
         grid = state.get("grid", {})
         
-        for entity in state.get("entities", []):
-            if entity.get("type") == type_str and "position" in entity:
-                x, y = entity["position"]
-                if grid["cells"][y][x] == 4:  # Goal cell
-                    count += 1
+        for x, y in BuiltInFunctions._positions_of(state, type_str, by_type):
+            if grid["cells"][y][x] == 4:  # Goal cell
+                count += 1
         
         return count
     
@@ -356,16 +427,25 @@ class BuiltInFunctions:
         Returns:
             Dictionary of function names to function objects
         """
+        # Entity positions grouped by type, built on the first spatial check.
+        # A context must not outlive changes to the entities.
+        grouped: List[Dict[str, List[Tuple[int, int]]]] = []
+        
+        def by_type() -> Dict[str, List[Tuple[int, int]]]:
+            if not grouped:
+                grouped.append(BuiltInFunctions.positions_by_type(state))
+            return grouped[0]
+        
         return {
-            "adjacent_to": lambda type_str: BuiltInFunctions.check_adjacent(state, type_str),
-            "distance_to": lambda type_str, max_dist: BuiltInFunctions.check_distance(state, type_str, max_dist),
-            "count_nearby": lambda type_str, radius: BuiltInFunctions.count_entities(state, type_str, radius),
+            "adjacent_to": lambda type_str: BuiltInFunctions.check_adjacent(state, type_str, by_type()),
+            "distance_to": lambda type_str, max_dist: BuiltInFunctions.check_distance(state, type_str, max_dist, by_type()),
+            "count_nearby": lambda type_str, radius: BuiltInFunctions.count_entities(state, type_str, radius, by_type()),
             "has_property": lambda prop: BuiltInFunctions.check_property(state, prop),
             "is_type": lambda type_str: BuiltInFunctions.check_type(state, type_str),
             "can_move_to": lambda x, y: BuiltInFunctions.check_movement(state, x, y),
             "has_support_below": lambda: BuiltInFunctions.has_support_below(state),
-            "can_see": lambda type_str, max_dist: BuiltInFunctions.can_see(state, type_str, max_dist),
-            "count_entities_on_goals": lambda type_str: BuiltInFunctions.count_entities_on_goals(state, type_str),
+            "can_see": lambda type_str, max_dist: BuiltInFunctions.can_see(state, type_str, max_dist, by_type()),
+            "count_entities_on_goals": lambda type_str: BuiltInFunctions.count_entities_on_goals(state, type_str, by_type()),
             "entity": BuiltInFunctions.get_current_entity(state),
             "state": state
         }
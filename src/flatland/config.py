@@ -2,7 +2,7 @@ import os
 
 _api_key = os.environ.get("FLATLAND_OPENAI_KEY", None)
 
-def set_api_key(key: str):
+def set_api_key(key: str) -> None:
     """
     Set the OpenAI API key.
     """
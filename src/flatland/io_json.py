@@ -0,0 +1,96 @@
+"""
+JSON encoding for FlatLand, backed by orjson when it is installed.
+"""
+
+import json
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj: Any, indent: bool = False, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """
+    Serialize an object to a JSON string.
+
+    Args:
+        obj: Object to serialize
+        indent: Pretty-print with two-space indentation
+        default: Called for objects that cannot otherwise be serialized
+
+    Returns:
+        JSON string
+    """
+    if orjson is not None:
+        # NumPy arrays (e.g. grids built with numpy) are written from their
+        # buffer without a tolist() round-trip
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option).decode("utf-8")
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=default)
+    # Match orjson's compact output so keys built from dumps() are stable
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=default)
+
+
+def dumpb(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    Serialize an object to compact UTF-8 JSON bytes, e.g. for an HTTP body.
+
+    Args:
+        obj: Object to serialize
+        default: Called for objects that cannot otherwise be serialized
+
+    Returns:
+        JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=default).encode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Deserialize a JSON string or bytes.
+
+    Args:
+        data: JSON document
+
+    Returns:
+        Deserialized object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(path: str) -> Any:
+    """
+    Read and deserialize a JSON file.
+
+    Args:
+        path: Path to the JSON file
+
+    Returns:
+        Deserialized object
+    """
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dump(obj: Any, path: str, indent: bool = True) -> None:
+    """
+    Serialize an object to a JSON file.
+
+    Args:
+        obj: Object to serialize
+        path: Path to write
+        indent: Pretty-print with two-space indentation
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(dumps(obj, indent=indent))
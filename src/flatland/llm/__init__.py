@@ -4,11 +4,15 @@ Provides tools for generating game environments using OpenAI's language models.
 """
 
 from .client import generate_environment, EnvironmentGenerator
+from .cache import PromptCache
+from .parallel import generate_many
 from .exceptions import FlatlandLLMError, SchemaValidationError, RateLimitError, LLMResponseError
 
 __all__ = [
     'generate_environment',
+    'generate_many',
     'EnvironmentGenerator',
+    'PromptCache',
     'FlatlandLLMError',
     'SchemaValidationError',
     'RateLimitError',
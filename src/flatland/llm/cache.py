@@ -0,0 +1,165 @@
+"""
+Prompt cache for FlatLand environment generation.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from .. import io_json
+
+# Filler words that do not change what environment is being asked for
+_STOPWORDS = frozenset({
+    "a", "an", "the", "with", "and", "of", "in", "on", "for", "to", "please",
+    "create", "make", "generate", "build", "me", "some", "that", "which", "is"
+})
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[x=][a-z0-9]+)*")
+
+
+def normalize_description(description: str) -> str:
+    """
+    Reduce a description to a structural key.
+
+    Lowercases and drops punctuation and filler words, so that "Create a
+    hard 15x15 maze!" and "hard 15x15 maze" map to the same key. Word order
+    is kept: "3 keys and 5 doors" and "5 keys and 3 doors" ask for
+    different environments.
+
+    Args:
+        description: Free-form environment description
+
+    Returns:
+        Normalized key string
+    """
+    tokens = _TOKEN_RE.findall(description.lower())
+    return " ".join(t for t in tokens if t not in _STOPWORDS)
+
+
+class PromptCache:
+    """LRU cache of generated environments keyed by normalized prompt."""
+
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None, ttl: Optional[float] = None):
+        """
+        Initialize the prompt cache.
+
+        Args:
+            max_entries: Maximum number of environments kept in memory
+            path: Optional SQLite file used to share entries across processes
+                and restarts
+            ttl: Optional lifetime of an entry in seconds; None keeps entries
+                until they are evicted
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (environment JSON, time stored)
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache "
+                "(key TEXT PRIMARY KEY, environment TEXT NOT NULL, stored_at REAL NOT NULL DEFAULT 0)"
+            )
+            try:
+                # Databases created before entries had a lifetime
+                self._db.execute("ALTER TABLE prompt_cache ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+            self._db.commit()
+
+    @staticmethod
+    def make_key(description: str, style_guidance: Optional[str], model: str) -> Tuple[str, str, str]:
+        """
+        Build the cache key for a generation request.
+
+        Args:
+            description: Free-form environment description
+            style_guidance: Optional styling/theme guidance
+            model: OpenAI model name
+
+        Returns:
+            Tuple of (normalized description, normalized style, model)
+        """
+        return (
+            normalize_description(description),
+            normalize_description(style_guidance or ""),
+            model
+        )
+
+    def lookup(self, description: str, style_guidance: Optional[str], model: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a previously generated environment.
+
+        Args:
+            description: Free-form environment description
+            style_guidance: Optional styling/theme guidance
+            model: OpenAI model name
+
+        Returns:
+            Fresh copy of the cached environment dict, or None on a miss
+        """
+        key = self.make_key(description, style_guidance, model)
+        blob = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[1]):
+                blob = entry[0]
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute(
+                    "SELECT environment, stored_at FROM prompt_cache WHERE key = ?",
+                    (io_json.dumps(key),)
+                ).fetchone()
+                if row and self._fresh(row[1]):
+                    blob = row[0]
+                    self._remember(key, blob, row[1])
+            if blob is None:
+                self._entries.pop(key, None)
+        return io_json.loads(blob) if blob is not None else None
+
+    def store(self, description: str, style_guidance: Optional[str], model: str, env_data: Dict[str, Any]) -> None:
+        """
+        Store a generated environment.
+
+        Args:
+            description: Free-form environment description
+            style_guidance: Optional styling/theme guidance
+            model: OpenAI model name
+            env_data: Environment definition dict
+        """
+        key = self.make_key(description, style_guidance, model)
+        blob = io_json.dumps(env_data)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, blob, stored_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO prompt_cache (key, environment, stored_at) VALUES (?, ?, ?)",
+                    (io_json.dumps(key), blob, stored_at)
+                )
+                self._db.commit()
+
+    def clear(self) -> None:
+        """Remove all cached environments."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM prompt_cache")
+                self._db.commit()
+
+    def _fresh(self, stored_at: float) -> bool:
+        """Whether an entry stored at the given wall-clock time is within the TTL."""
+        return self.ttl is None or time.time() - stored_at < self.ttl
+
+    def _remember(self, key: Tuple[str, str, str], blob: str, stored_at: float) -> None:
+        """Insert into the in-memory tier, evicting the least recently used entry."""
+        self._entries[key] = (blob, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
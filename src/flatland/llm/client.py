@@ -4,38 +4,119 @@ OpenAI client integration for FlatLand environment generation.
 
 import os
 import json
+import math
 import time
-from functools import wraps
-from typing import Optional, Dict, Any
+import threading
+from functools import wraps, lru_cache
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Iterator
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+try:
+    import httpx
+except ImportError:
+    httpx = None
 try:
     from openai.error import APIError, RateLimitError as OpenAIRateLimitError
 except ImportError:
     from openai import APIError, RateLimitError as OpenAIRateLimitError
 
+from .. import io_json
 from ..schemas import EnvironmentDefinition
 from ..validator import SchemaValidator, ValidationError
 from .exceptions import FlatlandLLMError, SchemaValidationError, RateLimitError, LLMResponseError
+from .cache import PromptCache
+from .streaming import ObjectScanner
+
+# Sampling parameters shared by interactive and batch completions. JSON mode
+# keeps replies to a bare object (no code fences or prose), and a low
+# temperature makes repeated prompts give similar environments.
+_COMPLETION_PARAMS: Dict[str, Any] = {
+    "temperature": 0.3,
+    "max_tokens": 4000,
+    "top_p": 1,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+    "response_format": {"type": "json_object"}
+}
+
+def _completion_params(max_tokens: Optional[int]) -> Dict[str, Any]:
+    """Return the sampling parameters, with max_tokens overridden if given."""
+    if max_tokens is None:
+        return _COMPLETION_PARAMS
+    return {**_COMPLETION_PARAMS, "max_tokens": max_tokens}
+
+# Start of the user message telling a retry what was wrong with the last attempt
+_FEEDBACK_PREFIX = "The previous response had validation errors:"
 
-def rate_limit(max_per_minute: int = 10):
-    """Decorator to implement rate limiting."""
-    calls = []
+# Batch statuses after which no further progress will be made
+_BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+@lru_cache(maxsize=4)
+def _read_prompt_template(path: str, mtime: float) -> str:
+    """Read a prompt template once per modification time."""
+    with open(path, 'r') as f:
+        return f.read()
+
+def _http_client_options() -> Dict[str, Any]:
+    """Connection pool settings shared by the sync and async OpenAI clients."""
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    return {
+        "http2": http2,
+        "limits": httpx.Limits(max_connections=100, max_keepalive_connections=100)
+    }
+
+@lru_cache(maxsize=None)
+def get_openai_client(api_key: str) -> OpenAI:
+    """Return the process-wide OpenAI client for an API key.
     
-    def decorator(func):
+    Sharing one client keeps its connection pool warm, so repeated
+    generations skip the TCP and TLS handshake with the API.
+    """
+    if httpx is None:
+        return OpenAI(api_key=api_key)
+    return OpenAI(api_key=api_key, http_client=httpx.Client(**_http_client_options()))
+
+def _new_async_openai_client(api_key: str) -> AsyncOpenAI:
+    """Create an AsyncOpenAI client with the same connection pooling as get_openai_client.
+    
+    Async clients are bound to the event loop they first run on, so they
+    are created per generator rather than shared process-wide.
+    """
+    if httpx is None:
+        return AsyncOpenAI(api_key=api_key)
+    return AsyncOpenAI(api_key=api_key, http_client=httpx.AsyncClient(**_http_client_options()))
+
+def rate_limit(max_per_minute: int = 10) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator to implement rate limiting.
+    
+    Uses a token bucket holding up to max_per_minute calls that refills
+    continuously, so each check is constant time.
+    """
+    rate = max_per_minute / 60.0
+    bucket = {"tokens": float(max_per_minute), "updated": time.monotonic()}
+    lock = threading.Lock()
+    
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
         @wraps(func)
-        def wrapper(*args, **kwargs):
-            now = time.time()
-            # Remove calls older than 1 minute
-            while calls and calls[0] < now - 60:
-                calls.pop(0)
-            if len(calls) >= max_per_minute:
-                wait_time = calls[0] + 60 - now
-                raise RateLimitError(
-                    f"Rate limit exceeded. Try again in {int(wait_time)} seconds.",
-                    retry_after=int(wait_time)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            # Shared across threads once a generator serves concurrent requests
+            with lock:
+                now = time.monotonic()
+                bucket["tokens"] = min(
+                    max_per_minute, bucket["tokens"] + (now - bucket["updated"]) * rate
                 )
-            calls.append(now)
+                bucket["updated"] = now
+                if bucket["tokens"] < 1:
+                    wait_time = math.ceil((1 - bucket["tokens"]) / rate)
+                    raise RateLimitError(
+                        f"Rate limit exceeded. Try again in {wait_time} seconds.",
+                        retry_after=wait_time
+                    )
+                bucket["tokens"] -= 1
             return func(*args, **kwargs)
         return wrapper
     return decorator
@@ -43,23 +124,31 @@ def rate_limit(max_per_minute: int = 10):
 class EnvironmentGenerator:
     """Main class for generating FlatLand environments using OpenAI."""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[PromptCache] = None):
         """Initialize the environment generator.
         
         Args:
             api_key: OpenAI API key. If not provided, will look for FLATLAND_OPENAI_KEY env var.
+            cache: Optional prompt cache consulted before calling the LLM
         """
-        self.api_key = api_key or os.getenv("FLATLAND_OPENAI_KEY")
-        if not self.api_key:
+        api_key = api_key or os.getenv("FLATLAND_OPENAI_KEY")
+        if not api_key:
             raise FlatlandLLMError(
                 "OpenAI API key not found. Set FLATLAND_OPENAI_KEY environment variable "
                 "or pass api_key to EnvironmentGenerator."
             )
+        self.api_key = api_key
         
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = get_openai_client(self.api_key)
+        self.async_client: Optional[AsyncOpenAI] = None
+        self.cache = cache
+        # Token counts of all completions; cached_prompt_tokens / prompt_tokens
+        # shows how well the shared prompt prefix is being cached
+        self.usage = {"prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
         self._load_prompt_template()
     
-    def _load_prompt_template(self):
+    def _load_prompt_template(self) -> None:
         """Load and prepare the system prompt template."""
         # Construct path relative to this file's location
         # client.py is in src/flatland/llm/
@@ -67,21 +156,23 @@ class EnvironmentGenerator:
         current_dir = os.path.dirname(__file__)
         template_path = os.path.join(current_dir, '..', 'prompt_template.txt')
         try:
-            with open(template_path, 'r') as f:
-                self.prompt_template = f.read()
+            self.prompt_template = _read_prompt_template(
+                template_path, os.path.getmtime(template_path)
+            )
         except FileNotFoundError:
             raise FlatlandLLMError(f"Could not find prompt template file at {template_path}")
     
     def _build_messages(self, description: str, style_guidance: Optional[str] = None) -> list:
-        """Build the message list for the OpenAI API call."""
+        """Build the message list for the OpenAI API call.
+        
+        Content that repeats across calls comes first (the system prompt, then
+        style guidance shared by many requests) and the description last, so
+        that OpenAI's prompt caching can reuse the longest possible prefix.
+        """
         messages = [
             {
                 "role": "system",
                 "content": self.prompt_template
-            },
-            {
-                "role": "user",
-                "content": description
             }
         ]
         
@@ -90,9 +181,24 @@ class EnvironmentGenerator:
                 "role": "user",
                 "content": f"Style guidance: {style_guidance}"
             })
-            
+        
+        messages.append({
+            "role": "user",
+            "content": description
+        })
         return messages
     
+    def _record_usage(self, response: Any) -> None:
+        """Add a completion's token counts to self.usage."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._usage_lock:
+            self.usage["prompt_tokens"] += usage.prompt_tokens or 0
+            self.usage["cached_prompt_tokens"] += getattr(details, "cached_tokens", None) or 0
+            self.usage["completion_tokens"] += usage.completion_tokens or 0
+    
     def _validate_environment(self, env_data: Dict[str, Any]) -> EnvironmentDefinition:
         """Validate the generated environment against the schema."""
         validator = SchemaValidator()
@@ -106,13 +212,13 @@ class EnvironmentGenerator:
             
         return EnvironmentDefinition.from_dict(env_data)
     
-    @rate_limit(max_per_minute=10)
     def generate(
         self,
         description: str,
         style_guidance: Optional[str] = None,
         model: str = "gpt-4-turbo-preview",
-        max_retries: int = 3
+        max_retries: int = 3,
+        max_tokens: Optional[int] = None
     ) -> EnvironmentDefinition:
         """Generate a FlatLand environment from a description.
         
@@ -121,6 +227,8 @@ class EnvironmentGenerator:
             style_guidance: Optional styling/theme guidance
             model: OpenAI model to use
             max_retries: Maximum number of retry attempts for validation failures
+            max_tokens: Optional cap on response tokens; lower caps return
+                sooner but may cut off large environments
             
         Returns:
             EnvironmentDefinition object representing the generated environment
@@ -131,59 +239,356 @@ class EnvironmentGenerator:
             LLMResponseError: If there are issues with the LLM response
             FlatlandLLMError: For other errors
         """
+        if self.cache is not None:
+            cached = self.cache.lookup(description, style_guidance, model)
+            if cached is not None:
+                return EnvironmentDefinition.from_dict(cached)
+        
+        env_def = self._generate(description, style_guidance, model, max_retries, max_tokens)
+        
+        if self.cache is not None:
+            self.cache.store(description, style_guidance, model, env_def.to_dict())
+        return env_def
+    
+    @rate_limit(max_per_minute=10)
+    def _generate(
+        self,
+        description: str,
+        style_guidance: Optional[str],
+        model: str,
+        max_retries: int,
+        max_tokens: Optional[int] = None
+    ) -> EnvironmentDefinition:
+        """Call the LLM until it produces a valid environment."""
         messages = self._build_messages(description, style_guidance)
+        params = _completion_params(max_tokens)
         
         for attempt in range(max_retries):
             try:
                 response = self.client.chat.completions.create(
                     model=model,
                     messages=messages,
-                    temperature=0.7,
-                    max_tokens=4000,
-                    top_p=1,
-                    frequency_penalty=0,
-                    presence_penalty=0
+                    **params
                 )
+            except OpenAIRateLimitError as e:
+                raise RateLimitError(str(e), retry_after=getattr(e, "retry_after", None))
+            except APIError as e:
+                raise FlatlandLLMError(f"OpenAI API error: {str(e)}")
+            
+            self._record_usage(response)
+            env_def = self._check_response(
+                response.choices[0].message.content,
+                messages,
+                last_attempt=attempt == max_retries - 1
+            )
+            if env_def is not None:
+                return env_def
                 
-                try:
-                    env_data = json.loads(response.choices[0].message.content)
-                except json.JSONDecodeError as e:
-                    if attempt < max_retries - 1:
-                        continue
-                    raise LLMResponseError(
-                        "Failed to parse LLM response as JSON",
-                        response_text=response.choices[0].message.content
-                    ) from e
-                
-                try:
-                    return self._validate_environment(env_data)
-                except SchemaValidationError as e:
-                    if attempt < max_retries - 1:
-                        # Add validation feedback for next attempt
-                        messages.append({
-                            "role": "user",
-                            "content": f"The previous response had validation errors: {str(e)}"
-                        })
-                        continue
-                    raise
-                    
+        raise LLMResponseError(
+            f"Failed to generate valid environment after {max_retries} attempts"
+        )
+    
+    async def generate_async(
+        self,
+        description: str,
+        style_guidance: Optional[str] = None,
+        model: str = "gpt-4-turbo-preview",
+        max_retries: int = 3,
+        throttle: Optional[Callable[[list], Awaitable[None]]] = None,
+        max_tokens: Optional[int] = None
+    ) -> EnvironmentDefinition:
+        """Generate a FlatLand environment without blocking the event loop.
+        
+        Behaves like generate(), but awaits the OpenAI call so that async
+        servers can overlap many generations. The per-process rate limit of
+        generate() is not applied; pass a throttle to pace requests instead.
+        
+        Args:
+            description: Free-form description of the desired environment
+            style_guidance: Optional styling/theme guidance
+            model: OpenAI model to use
+            max_retries: Maximum number of retry attempts for validation failures
+            throttle: Optional coroutine function awaited with the messages
+                before every API request
+            max_tokens: Optional cap on response tokens
+            
+        Returns:
+            EnvironmentDefinition object representing the generated environment
+            
+        Raises:
+            SchemaValidationError: If the generated environment is invalid
+            RateLimitError: If API rate limits are exceeded
+            LLMResponseError: If there are issues with the LLM response
+            FlatlandLLMError: For other errors
+        """
+        if self.cache is not None:
+            cached = self.cache.lookup(description, style_guidance, model)
+            if cached is not None:
+                return EnvironmentDefinition.from_dict(cached)
+        
+        if self.async_client is None:
+            self.async_client = _new_async_openai_client(self.api_key)
+        messages = self._build_messages(description, style_guidance)
+        params = _completion_params(max_tokens)
+        
+        for attempt in range(max_retries):
+            if throttle is not None:
+                await throttle(messages)
+            try:
+                response = await self.async_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    **params
+                )
             except OpenAIRateLimitError as e:
-                raise RateLimitError(str(e), retry_after=e.retry_after)
+                raise RateLimitError(str(e), retry_after=getattr(e, "retry_after", None))
             except APIError as e:
                 raise FlatlandLLMError(f"OpenAI API error: {str(e)}")
+            
+            self._record_usage(response)
+            env_def = self._check_response(
+                response.choices[0].message.content,
+                messages,
+                last_attempt=attempt == max_retries - 1
+            )
+            if env_def is not None:
+                if self.cache is not None:
+                    self.cache.store(description, style_guidance, model, env_def.to_dict())
+                return env_def
                 
         raise LLMResponseError(
             f"Failed to generate valid environment after {max_retries} attempts"
         )
+    
+    def generate_stream(
+        self,
+        description: str,
+        style_guidance: Optional[str] = None,
+        model: str = "gpt-4-turbo-preview",
+        max_tokens: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Generate a FlatLand environment, yielding progress as the response streams.
+        
+        Yields event dicts in order:
+            {"type": "delta", "content": str} for every streamed text chunk
+            {"type": "grid", "grid": dict} once the grid object has fully arrived,
+                so a client can render the layout before the rules are done
+            {"type": "environment", "environment": EnvironmentDefinition} once
+                the full response has been validated
+        
+        A streamed response is not retried; use generate() for validation retries.
+        Cache hits yield only the final environment event.
+        
+        Args:
+            description: Free-form description of the desired environment
+            style_guidance: Optional styling/theme guidance
+            model: OpenAI model to use
+            max_tokens: Optional cap on response tokens
+        
+        Raises:
+            SchemaValidationError: If the generated environment is invalid
+            RateLimitError: If API rate limits are exceeded
+            LLMResponseError: If the response is not valid JSON
+            FlatlandLLMError: For other errors
+        """
+        if self.cache is not None:
+            cached = self.cache.lookup(description, style_guidance, model)
+            if cached is not None:
+                yield {"type": "environment", "environment": EnvironmentDefinition.from_dict(cached)}
+                return
+        
+        messages = self._build_messages(description, style_guidance)
+        scanner = ObjectScanner("grid")
+        parts = []
+        try:
+            stream = self._open_stream(model, messages, max_tokens)
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if not text:
+                    continue
+                parts.append(text)
+                yield {"type": "delta", "content": text}
+                grid = scanner.feed(text)
+                if grid is not None:
+                    yield {"type": "grid", "grid": grid}
+        except OpenAIRateLimitError as e:
+            raise RateLimitError(str(e), retry_after=getattr(e, "retry_after", None))
+        except APIError as e:
+            raise FlatlandLLMError(f"OpenAI API error: {str(e)}")
+        
+        env_def = self._check_response("".join(parts), messages, last_attempt=True)
+        if self.cache is not None:
+            self.cache.store(description, style_guidance, model, env_def.to_dict())
+        yield {"type": "environment", "environment": env_def}
+    
+    @rate_limit(max_per_minute=10)
+    def _open_stream(self, model: str, messages: list, max_tokens: Optional[int]) -> Iterator[Any]:
+        """Start a streamed completion.
+        
+        Rate limited here rather than on generate_stream, whose calls only
+        create a generator; the limit must apply when the request is made.
+        """
+        return self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            **_completion_params(max_tokens)
+        )
+    
+    def _check_response(
+        self,
+        content: str,
+        messages: list,
+        last_attempt: bool
+    ) -> Optional[EnvironmentDefinition]:
+        """Parse and validate one completion.
+        
+        Returns None when the attempt should be retried, after setting the
+        validation feedback in messages. On the last attempt, errors are
+        raised instead.
+        """
+        try:
+            env_data = io_json.loads(content)
+        except json.JSONDecodeError as e:
+            if not last_attempt:
+                self._set_feedback(messages, [f"Response was not valid JSON: {e}"])
+                return None
+            raise LLMResponseError(
+                "Failed to parse LLM response as JSON",
+                response_text=content
+            ) from e
+        
+        try:
+            return self._validate_environment(env_data)
+        except SchemaValidationError as e:
+            if last_attempt:
+                raise
+            self._set_feedback(messages, e.validation_errors or [str(e)])
+            return None
+    
+    @staticmethod
+    def _set_feedback(messages: list, errors: List[str]) -> None:
+        """Tell the next attempt what was wrong with the last one.
+        
+        Only the most recent errors are kept: feedback from an earlier retry
+        is replaced rather than appended to, so the prompt (and its token
+        cost) stays the same size however many retries are made.
+        """
+        feedback = {
+            "role": "user",
+            "content": "\n".join([_FEEDBACK_PREFIX, *errors, "Please fix them and return valid JSON."])
+        }
+        if messages[-1]["content"].startswith(_FEEDBACK_PREFIX):
+            messages[-1] = feedback
+        else:
+            messages.append(feedback)
+    
+    def generate_batch(
+        self,
+        descriptions: List[str],
+        style_guidance: Optional[str] = None,
+        model: str = "gpt-4-turbo-preview",
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None
+    ) -> List[Optional[EnvironmentDefinition]]:
+        """Generate many environments through the OpenAI Batch API.
+        
+        Batch requests are billed at a discount and draw from a separate rate
+        limit pool, but may take up to 24 hours to complete, so this is meant
+        for offline bulk generation rather than interactive use. Responses are
+        not retried; a description whose response fails to parse or validate
+        yields None in the result list.
+        
+        Args:
+            descriptions: Free-form descriptions of the desired environments
+            style_guidance: Optional styling/theme guidance applied to all descriptions
+            model: OpenAI model to use
+            poll_interval: Seconds to wait between batch status checks
+            timeout: Maximum seconds to wait for the batch, or None to wait indefinitely
+            
+        Returns:
+            List of EnvironmentDefinition objects (or None), aligned with descriptions
+            
+        Raises:
+            RateLimitError: If API rate limits are exceeded
+            FlatlandLLMError: If the batch fails, expires, or times out
+        """
+        lines = []
+        for i, description in enumerate(descriptions):
+            lines.append(io_json.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": self._build_messages(description, style_guidance),
+                    **_COMPLETION_PARAMS
+                }
+            }))
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        
+        try:
+            input_file = self.client.files.create(
+                file=("environments.jsonl", payload),
+                purpose="batch"
+            )
+            batch = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while batch.status not in _BATCH_TERMINAL_STATUSES:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise FlatlandLLMError(
+                        f"Batch {batch.id} did not complete within {timeout} seconds"
+                    )
+                time.sleep(poll_interval)
+                batch = self.client.batches.retrieve(batch.id)
+            
+            if batch.status != "completed" or not batch.output_file_id:
+                raise FlatlandLLMError(f"Batch {batch.id} ended with status '{batch.status}'")
+            
+            output = self.client.files.content(batch.output_file_id).text
+        except OpenAIRateLimitError as e:
+            raise RateLimitError(str(e), retry_after=getattr(e, "retry_after", None))
+        except APIError as e:
+            raise FlatlandLLMError(f"OpenAI API error: {str(e)}")
+        
+        results: List[Optional[EnvironmentDefinition]] = [None] * len(descriptions)
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = io_json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            try:
+                content = response["body"]["choices"][0]["message"]["content"]
+                results[int(record["custom_id"])] = self._validate_environment(io_json.loads(content))
+            except (KeyError, IndexError, ValueError, SchemaValidationError):
+                continue
+        
+        return results
+
+@lru_cache(maxsize=None)
+def _default_generator(api_key: Optional[str]) -> EnvironmentGenerator:
+    """Return the generator shared by generate_environment calls for an API key."""
+    return EnvironmentGenerator(api_key=api_key)
 
 def generate_environment(
     description: str,
     style_guidance: Optional[str] = None,
-    **kwargs
+    **kwargs: Any
 ) -> EnvironmentDefinition:
     """Convenience function to generate a FlatLand environment.
     
-    This is the main entry point for the library.
+    This is the main entry point for the library. Calls share one
+    EnvironmentGenerator per API key, so servers calling this per request
+    reuse its client and connection pool.
     
     Args:
         description: Free-form description of the desired environment
@@ -193,5 +598,5 @@ def generate_environment(
     Returns:
         EnvironmentDefinition object representing the generated environment
     """
-    generator = EnvironmentGenerator()
+    generator = _default_generator(os.getenv("FLATLAND_OPENAI_KEY"))
     return generator.generate(description, style_guidance, **kwargs)
@@ -0,0 +1,112 @@
+"""
+Concurrent environment generation for bulk workloads.
+"""
+
+import asyncio
+import random
+import time
+from typing import Optional, List
+
+from ..schemas import EnvironmentDefinition
+from .client import EnvironmentGenerator, _COMPLETION_PARAMS
+from .exceptions import FlatlandLLMError, RateLimitError
+
+
+class TokenBucket:
+    """Token bucket limiter that refills continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float):
+        """
+        Initialize the bucket full.
+
+        Args:
+            per_minute: Capacity of the bucket and its refill rate per minute
+        """
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """
+        Wait until `amount` tokens are available and take them.
+
+        Args:
+            amount: Number of tokens to take; capped at the bucket capacity
+        """
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+def _estimate_tokens(messages: list) -> int:
+    """Rough token count for a request: prompt characters / 4 plus the completion budget."""
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    return prompt_chars // 4 + int(_COMPLETION_PARAMS["max_tokens"])
+
+
+async def generate_many(
+    descriptions: List[str],
+    style_guidance: Optional[str] = None,
+    model: str = "gpt-4-turbo-preview",
+    api_key: Optional[str] = None,
+    concurrency: int = 20,
+    rpm: float = 500,
+    tpm: float = 1_000_000,
+    max_retries: int = 3
+) -> List[Optional[EnvironmentDefinition]]:
+    """Generate many environments concurrently within request and token rate limits.
+
+    Args:
+        descriptions: Free-form descriptions of the desired environments
+        style_guidance: Optional styling/theme guidance applied to all descriptions
+        model: OpenAI model to use
+        api_key: OpenAI API key. If not provided, will look for FLATLAND_OPENAI_KEY env var.
+        concurrency: Maximum number of requests in flight at once
+        rpm: Requests per minute allowed by the account
+        tpm: Tokens per minute allowed by the account
+        max_retries: Maximum attempts per description, both for rate limit
+            backoff and for invalid responses
+
+    Returns:
+        List of EnvironmentDefinition objects, aligned with descriptions; None
+        where every attempt failed
+    """
+    generator = EnvironmentGenerator(api_key=api_key)
+    semaphore = asyncio.Semaphore(concurrency)
+    request_bucket = TokenBucket(rpm)
+    token_bucket = TokenBucket(tpm)
+
+    async def throttle(messages: list) -> None:
+        await request_bucket.acquire()
+        await token_bucket.acquire(_estimate_tokens(messages))
+
+    async def generate_one(description: str) -> Optional[EnvironmentDefinition]:
+        async with semaphore:
+            for attempt in range(max_retries):
+                try:
+                    return await generator.generate_async(
+                        description,
+                        style_guidance,
+                        model=model,
+                        max_retries=max_retries,
+                        throttle=throttle
+                    )
+                except RateLimitError:
+                    # Exponential backoff with jitter before the next attempt
+                    await asyncio.sleep(min(60, 2 ** attempt) + random.random())
+                except FlatlandLLMError:
+                    return None
+        return None
+
+    try:
+        return list(await asyncio.gather(*(generate_one(d) for d in descriptions)))
+    finally:
+        if generator.async_client is not None:
+            await generator.async_client.close()
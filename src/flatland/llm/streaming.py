@@ -0,0 +1,83 @@
+"""
+Incremental scanning of streamed JSON for FlatLand environment generation.
+"""
+
+from typing import Optional, Any
+
+from .. import io_json
+
+
+class ObjectScanner:
+    """Finds the first complete JSON object stored under a key in a growing buffer.
+
+    Text is fed chunk by chunk as it streams in. Each character is examined
+    once, so scanning a whole response is linear in its length.
+    """
+
+    def __init__(self, key: str):
+        """
+        Initialize the scanner.
+
+        Args:
+            key: Object key to look for, e.g. "grid"
+        """
+        self._needle = f'"{key}"'
+        self._buffer = ""
+        self._search_from = 0
+        self._start = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.result: Optional[Any] = None
+
+    def feed(self, text: str) -> Optional[Any]:
+        """
+        Add streamed text and return the object once it is complete.
+
+        Args:
+            text: Next chunk of the JSON document
+
+        Returns:
+            The parsed object the first time it completes, otherwise None
+        """
+        if self.result is not None:
+            return None
+        self._buffer += text
+
+        if self._start < 0:
+            key_at = self._buffer.find(self._needle, self._search_from)
+            if key_at < 0:
+                # Keep enough overlap to match a key split across chunks
+                self._search_from = max(0, len(self._buffer) - len(self._needle))
+                return None
+            brace_at = self._buffer.find("{", key_at + len(self._needle))
+            if brace_at < 0:
+                self._search_from = key_at
+                return None
+            self._start = self._pos = brace_at
+
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        self.result = io_json.loads(buffer[self._start:i + 1])
+                    except ValueError:
+                        return None
+                    return self.result
+        self._pos = len(buffer)
+        return None
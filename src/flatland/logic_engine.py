@@ -2,31 +2,93 @@
 Main logic engine for FlatLand environments.
 """
 
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional, Set, Tuple
+import hashlib
 import json
+import logging
+import threading
+from types import CodeType
 
+from . import io_json
 from .models import Rule
 from .validator import SchemaValidator, RuleConflictDetector, DependencyResolver, ValidationError
 from .state_manager import StateManager
 from .built_in_functions import BuiltInFunctions
 
+logger = logging.getLogger(__name__)
+
+# (dx, dy) for each movement command
+_COMMAND_DELTAS = {
+    "up": (0, -1),
+    "down": (0, 1),
+    "left": (-1, 0),
+    "right": (1, 0)
+}
+
+# Digests of environment definitions that passed validation, so identical
+# definitions (e.g. the same cached prompt loaded for many games) are only
+# validated once per process
+_VALIDATED_MAX = 256
+_validated: "OrderedDict[bytes, None]" = OrderedDict()
+_validated_lock = threading.Lock()
+
+
+def _definition_digest(json_data: Dict[str, Any]) -> bytes:
+    """Hash an environment definition's JSON encoding."""
+    return hashlib.blake2b(io_json.dumpb(json_data), digest_size=16).digest()
+
+
 class LogicEngine:
     """Main engine that evaluates rules and manages state transitions."""
     
-    def __init__(self):
+    def __init__(self) -> None:
         self.rules: List[Rule] = []
         self.state_manager = StateManager(max_history=1000)
         self.schema_validator = SchemaValidator()
+        # Index of the player in state["entities"], checked before each use
+        self._player_index: Optional[int] = None
+        # Condition strings compiled to code objects, so eval() skips parsing
+        self._compiled_conditions: Dict[str, Any] = {}
+        # The engine is not thread-safe; callers sharing it between threads
+        # (e.g. concurrent requests for one game) hold this while using it.
+        # Separate engines need no coordination.
+        self.lock = threading.RLock()
+        # (state, version, (victory, failure)) from the last game-over check
+        self._game_over_memo: Optional[Tuple[Dict[str, Any], int, Tuple[bool, bool]]] = None
         
-    def load_environment(self, json_data: Dict[str, Any]):
-        """Load an environment definition from JSON."""
+    def load_environment(self, json_data: Dict[str, Any], validate: bool = True) -> None:
+        """Load an environment definition from JSON.
+        
+        Args:
+            json_data: Environment definition
+            validate: Validate the definition and its rules and report rule
+                conflicts. Pass False only for definitions that already passed
+                validation, e.g. when restoring a saved session. A definition
+                identical to one that already passed validation in this
+                process is not validated again.
+        """
+        digest = None
+        if validate:
+            digest = _definition_digest(json_data)
+            with _validated_lock:
+                if digest in _validated:
+                    _validated.move_to_end(digest)
+                    validate = False
+                    digest = None
+            
         # Validate environment definition
-        is_valid, errors = self.schema_validator.validate_environment(json_data)
-        if not is_valid:
-            raise ValidationError("Invalid environment definition", errors)
+        if validate:
+            is_valid, errors = self.schema_validator.validate_environment(json_data)
+            if not is_valid:
+                raise ValidationError("Invalid environment definition", errors)
             
+        # Keep the definition so the session can be rebuilt from a snapshot
+        self.environment = json_data
+        
         # Load initial state
         self.state_manager.set_initial_state(json_data["initial_state"])
+        self._player_index = None
         
         # Parse and validate rules
         self.rules = []
@@ -38,38 +100,51 @@ class LogicEngine:
                 when=rule_def["when"],
                 then=rule_def["then"]
             )
-            is_valid, errors = self.schema_validator.validate_rule(rule)
-            if is_valid:
-                self.rules.append(rule)
-            else:
-                raise ValidationError(f"Invalid rule: {rule.name}", errors)
+            if validate:
+                is_valid, errors = self.schema_validator.validate_rule(rule)
+                if not is_valid:
+                    raise ValidationError(f"Invalid rule: {rule.name}", errors)
+            self.rules.append(rule)
         
         # Sort rules by priority
         self.rules.sort(key=lambda r: r.priority, reverse=True)
         
         # Check for rule conflicts
-        conflicts = RuleConflictDetector.detect_conflicts(self.rules)
+        conflicts = RuleConflictDetector.detect_conflicts(self.rules) if validate else []
         if conflicts:
             conflict_msgs = [f"Conflict between {r1.name} and {r2.name}: {reason}" 
                             for r1, r2, reason in conflicts]
-            print("Warning: Rule conflicts detected:")
-            for msg in conflict_msgs:
-                print(f"  - {msg}")
+            logger.warning("Rule conflicts detected:\n%s", "\n".join(f"  - {msg}" for msg in conflict_msgs))
         
         # Build dependency graph
         self.dependency_graph = DependencyResolver.build_dependency_graph(self.rules)
         
         # Check for dependency cycles
-        cycles = DependencyResolver.detect_cycles(self.dependency_graph)
+        cycles = DependencyResolver.detect_cycles(self.dependency_graph) if validate else []
         if cycles:
             cycle_msgs = [" -> ".join(cycle) for cycle in cycles]
-            print("Warning: Rule dependency cycles detected:")
-            for msg in cycle_msgs:
-                print(f"  - {msg}")
+            logger.warning("Rule dependency cycles detected:\n%s", "\n".join(f"  - {msg}" for msg in cycle_msgs))
+        
+        if digest is not None:
+            with _validated_lock:
+                _validated[digest] = None
+                if len(_validated) > _VALIDATED_MAX:
+                    _validated.popitem(last=False)
         
         # Load victory and failure conditions
         self.victory_conditions = json_data.get("victory_conditions", [])
         self.failure_conditions = json_data.get("failure_conditions", [])
+        self._game_over_memo = None
+        
+        # Parse every condition once here instead of on each evaluation
+        self._compiled_conditions = {}
+        for condition in ([rule.when["condition"] for rule in self.rules] +
+                          [c["condition"] for c in self.victory_conditions + self.failure_conditions]):
+            self._compile_condition(condition)
+        
+    def get_current_state(self) -> Dict[str, Any]:
+        """Get a copy of the current simulation state."""
+        return self.state_manager.get_current_state()
         
     def process_input(self, command: str) -> Dict[str, Any]:
         """Process player input command and execute a simulation step.
@@ -80,12 +155,9 @@ class LogicEngine:
         Returns:
             Dict containing the new state, changes, and victory/failure status
         """
-        # Convert command to target position
-        state = self.state_manager.get_current_state()
-        current_entity = next(
-            (e for e in state["entities"] if e["type"] == "player"),
-            None
-        )
+        # Read the live state directly; nothing is modified until the move is applied
+        state = self.state_manager.current_state
+        current_entity = self._find_player(state)
         
         if not current_entity:
             return {"error": "No player entity found"}
@@ -93,28 +165,27 @@ class LogicEngine:
         x, y = current_entity["position"]
         
         # Calculate target position based on command
-        if command == "up":
-            target_x, target_y = x, y - 1
-        elif command == "down":
-            target_x, target_y = x, y + 1
-        elif command == "left":
-            target_x, target_y = x - 1, y
-        elif command == "right":
-            target_x, target_y = x + 1, y
-        else:
+        delta = _COMMAND_DELTAS.get(command)
+        if delta is None:
             return {"error": f"Unknown command: {command}"}
-            
+        target_x, target_y = x + delta[0], y + delta[1]
+        
+        grid = state["grid"]
+        if not (0 <= target_x < grid["width"] and 0 <= target_y < grid["height"]):
+            return {"error": "Cannot move there"}
+        
         # Debug movement check
-        print(f"\nDebug: Checking movement to ({target_x}, {target_y})")
-        print(f"Cell value at target: {state['grid']['cells'][target_y][target_x]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Checking movement to (%d, %d); cell value at target: %s",
+                         target_x, target_y, grid["cells"][target_y][target_x])
+        
+        # Set current entity first so box pushes know the push direction
+        state["current_entity"] = current_entity
         
         # Check if target position is valid
         can_move = BuiltInFunctions.check_movement(state, target_x, target_y)
         if not can_move:
             return {"error": "Cannot move there"}
-            
-        # Set current entity in the state manager's state
-        self.state_manager.current_state["current_entity"] = current_entity
         
         # Create a move action
         action = {
@@ -142,6 +213,47 @@ class LogicEngine:
             
         return {"error": "Move failed"}
         
+    def process_input_diff(self, command: str, since_version: int) -> Dict[str, Any]:
+        """Process player input, describing the new state as a diff when possible.
+        
+        If since_version is the state version the caller already has, the
+        "state" of a successful move is replaced by a "diff" in the format of
+        StateManager.compute_state_diff, which is much smaller for large
+        states. Otherwise the result is the same as process_input.
+        
+        Args:
+            command: String command (e.g., "up", "down", "left", "right")
+            since_version: State version the caller last received
+            
+        Returns:
+            Result of process_input, with "diff" in place of "state" when
+            since_version is current, and the new state "version"
+        """
+        state_manager = self.state_manager
+        old_state = None
+        if since_version == state_manager.version:
+            old_state = state_manager.get_current_state()
+        
+        result = self.process_input(command)
+        if old_state is not None and "state" in result:
+            result["diff"] = state_manager.compute_state_diff(old_state, result.pop("state"))
+        result["version"] = state_manager.version
+        return result
+        
+    def _find_player(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Find the player entity, reusing its index from the previous lookup when still valid."""
+        entities = state["entities"]
+        i = self._player_index
+        if i is not None and i < len(entities) and entities[i]["type"] == "player":
+            return entities[i]
+        
+        for i, entity in enumerate(entities):
+            if entity["type"] == "player":
+                self._player_index = i
+                return entity
+        self._player_index = None
+        return None
+        
     def step(self) -> Dict[str, Any]:
         """Execute one step of the simulation.
         
@@ -149,16 +261,26 @@ class LogicEngine:
             Dict containing the new state, changes, and victory/failure status
         """
         changes = []
+        state = self.state_manager.current_state
+        
+        # The entity types present and the evaluation context are shared by
+        # all rules, and only rebuilt after an action has changed the state
+        present_types = None
+        context = None
         
         # Evaluate rules in priority order
         for rule in self.rules:
-            if self._evaluate_condition(rule.when):
+            if present_types is None:
+                present_types = BuiltInFunctions.entity_types(state)
+                context = BuiltInFunctions.create_function_context(state)
+            if self._evaluate_condition(rule.when, present_types, context):
                 result = self._apply_action(rule.then)
                 if result:
                     changes.append({
                         "rule": rule.name,
                         "effect": result
                     })
+                    present_types = None
                     
         # Update state history
         self.state_manager.record_step(changes)
@@ -176,64 +298,104 @@ class LogicEngine:
 
     def check_victory_conditions(self) -> bool:
         """Check if any victory conditions are met."""
-        if not hasattr(self, 'victory_conditions'):
-            return False
-            
-        state = self.state_manager.get_current_state()
-        for condition in self.victory_conditions:
-            # Set the state context for condition evaluation
-            state["current_entity"] = None  # Reset for global conditions
-            
-            if not self._evaluate_condition({"condition": condition["condition"]}):
-                return False
-        return True
+        return self._game_over_status()[0]
         
     def check_failure_conditions(self) -> bool:
         """Check if any failure conditions are met."""
-        if not hasattr(self, 'failure_conditions'):
-            return False
-            
-        state = self.state_manager.get_current_state()
-        for condition in self.failure_conditions:
-            # Set the state context for condition evaluation
-            state["current_entity"] = None  # Reset for global conditions
-            
-            if self._evaluate_condition({"condition": condition["condition"]}):
-                return True
-        return False
+        return self._game_over_status()[1]
+        
+    def _game_over_status(self) -> Tuple[bool, bool]:
+        """Evaluate the victory and failure conditions, once per state version.
+        
+        The state only changes through steps, undo and redo, which bump
+        StateManager.version, or by replacing it, so an unchanged state
+        object and version mean the previous result still holds.
+        """
+        state_manager = self.state_manager
+        state = state_manager.current_state
+        memo = self._game_over_memo
+        if memo is not None and memo[0] is state and memo[1] == state_manager.version:
+            return memo[2]
+        
+        if not hasattr(self, 'victory_conditions'):
+            return False, False
+        
+        # One function context serves every condition
+        context = BuiltInFunctions.create_function_context(state)
+        victory = all(
+            self._evaluate_condition({"condition": c["condition"]}, context=context)
+            for c in self.victory_conditions
+        )
+        failure = any(
+            self._evaluate_condition({"condition": c["condition"]}, context=context)
+            for c in self.failure_conditions
+        )
+        self._game_over_memo = (state, state_manager.version, (victory, failure))
+        return victory, failure
+        
+    def _evaluate_condition(self, condition: Dict[str, Any],
+                            present_types: Optional[Set[str]] = None,
+                            context: Optional[Dict[str, Any]] = None) -> bool:
+        """Evaluate a rule's condition against current state.
         
-    def _evaluate_condition(self, condition: Dict[str, Any]) -> bool:
-        """Evaluate a rule's condition against current state."""
-        # Get current state
-        state = self.state_manager.get_current_state()
+        Args:
+            condition: Condition with a "condition" string and optional
+                required "entities"
+            present_types: Entity types in the current state, if already known
+            context: Function context for the current state, if already built
+        """
+        # Conditions only read the state, so evaluate them against the live
+        # state instead of deep-copying it for every rule on every step
+        state = self.state_manager.current_state
         
         # Extract condition components
         condition_str = condition["condition"]
         required_entities = condition.get("entities", [])
         
         # Check entity requirements
-        if "any" not in required_entities:
-            for entity_type in required_entities:
-                if not BuiltInFunctions.has_entity_type(state, entity_type):
-                    return False
+        if required_entities and "any" not in required_entities:
+            if present_types is None:
+                present_types = BuiltInFunctions.entity_types(state)
+            if not all(t in present_types for t in required_entities):
+                return False
         
         # Evaluate condition using built-in functions
         try:
-            return self._evaluate_condition_string(condition_str, state)
+            return self._evaluate_condition_string(condition_str, state, context)
         except Exception as e:
-            print(f"Error evaluating condition: {e}")
+            logger.warning("Error evaluating condition: %s", e)
             return False
             
-    def _evaluate_condition_string(self, condition: str, state: Dict[str, Any]) -> bool:
+    def _compile_condition(self, condition: str) -> Optional[CodeType]:
+        """Compile a condition string, caching the code object; None if it does not parse."""
+        try:
+            return self._compiled_conditions[condition]
+        except KeyError:
+            pass
+        try:
+            code = compile(condition, "<condition>", "eval")
+        except SyntaxError as e:
+            logger.warning("Error compiling condition %r: %s", condition, e)
+            code = None
+        self._compiled_conditions[condition] = code
+        return code
+        
+    def _evaluate_condition_string(self, condition: str, state: Dict[str, Any],
+                                   context: Optional[Dict[str, Any]] = None) -> bool:
         """Evaluate a condition string with built-in functions."""
+        code = self._compile_condition(condition)
+        if code is None:
+            return False
+        
         # Create context with built-in functions
-        context = BuiltInFunctions.create_function_context(state)
+        if context is None:
+            context = BuiltInFunctions.create_function_context(state)
         
         # Evaluate condition in context
         try:
-            return eval(condition, {"__builtins__": {}}, context)
+            return eval(code, {"__builtins__": {}}, context)
         except Exception as e:
-            print(f"Error evaluating condition string: {e}")
+            logger.warning("Error evaluating condition string: %s", e)
             return False
             
     def _apply_action(self, action: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -8,6 +8,10 @@ from typing import Dict, Any
 @dataclass
 class Rule:
     """Represents a single rule in the logic system."""
+    # Declared by hand since dataclass(slots=True) needs Python 3.10; the
+    # fields have no defaults, so the class attributes do not clash
+    __slots__ = ("name", "type", "priority", "when", "then")
+
     name: str
     type: str  # conditional | transformation | constraint
     priority: int
@@ -0,0 +1,81 @@
+"""
+Text rendering for FlatLand grids.
+"""
+
+import sys
+from typing import Dict, Any, List, Optional, TextIO
+
+# 256-entry translation table mapping cell values to symbols; values without a
+# symbol render as '?'. 0=empty, 1=wall, 2=player, 3=box, 4=goal
+_SYMBOL_LUT = b".#@*o".ljust(256, b"?")
+
+# ANSI escape: cursor home, then clear screen
+_CLEAR_SCREEN = "\x1b[H\x1b[2J"
+
+
+def _render_row(row: List[int]) -> str:
+    """Render one row of cells via a C-level table lookup."""
+    try:
+        return bytes(row).translate(_SYMBOL_LUT).decode("ascii")
+    except (ValueError, TypeError):
+        # Non-integer cells or values outside 0-255 cannot be packed into bytes
+        return "".join(_symbol(c) for c in row)
+
+
+def _symbol(cell: Any) -> str:
+    """Symbol for one cell; anything but a whole number in 0-255 renders as '?'."""
+    if isinstance(cell, float) and cell.is_integer():
+        cell = int(cell)
+    if isinstance(cell, int) and 0 <= cell < 256:
+        return chr(_SYMBOL_LUT[cell])
+    return "?"
+
+
+def render_grid(cells: List[List[int]]) -> str:
+    """
+    Render grid cells as rows of symbols.
+
+    Args:
+        cells: 2D array of cell values
+
+    Returns:
+        Rendered grid, one line per row
+    """
+    return "\n".join(_render_row(row) for row in cells)
+
+
+def print_state(
+    state: Dict[str, Any],
+    file: Optional[TextIO] = None,
+    clear: bool = False,
+    show_raw: bool = False
+) -> None:
+    """
+    Print the grid of a state as a single frame.
+
+    The whole frame is built in memory and emitted with one write and one
+    flush, so redrawing in a game loop costs a single I/O call per frame.
+
+    Args:
+        state: State containing a grid
+        file: Stream to write to, defaults to stdout
+        clear: Move the cursor home and clear the terminal before drawing,
+            for flicker-free redraws in interactive loops
+        show_raw: Also print the numeric cell values above the symbols, for
+            debugging; both are produced in the same pass over the grid
+    """
+    out = file or sys.stdout
+    cells = state.get("grid", {}).get("cells", [])
+    if show_raw:
+        raw_rows = []
+        symbol_rows = []
+        for row in cells:
+            raw_rows.append(" ".join(map(str, row)))
+            symbol_rows.append(_render_row(row))
+        frame = "\n".join(raw_rows) + "\n\n" + "\n".join(symbol_rows) + "\n"
+    else:
+        frame = render_grid(cells) + "\n"
+    if clear:
+        frame = _CLEAR_SCREEN + frame
+    out.write(frame)
+    out.flush()
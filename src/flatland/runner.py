@@ -0,0 +1,106 @@
+"""
+Headless runner for replaying command scripts against FlatLand environments.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Iterable, Optional, Union
+
+from . import io_json
+from .logic_engine import LogicEngine
+
+
+@lru_cache(maxsize=32)
+def _read_environment_file(path: str, mtime: float) -> bytes:
+    """Read an environment file once per modification time."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load_environment_file(path: str) -> Dict[str, Any]:
+    """
+    Load an environment definition from a JSON file.
+
+    The file contents are cached until the file changes, so suites that
+    replay many scripts against the same environment read it once. Each
+    call returns a freshly decoded dict that the caller may modify.
+
+    Args:
+        path: Path to the environment JSON file
+
+    Returns:
+        Environment definition dict
+    """
+    path = os.path.realpath(path)
+    return io_json.loads(_read_environment_file(path, os.path.getmtime(path)))
+
+
+def run_script(env_def: Union[Dict[str, Any], str], commands: Iterable[str], keep_trace: bool = True) -> Dict[str, Any]:
+    """
+    Play a sequence of commands against an environment without any terminal I/O.
+
+    Commands are applied in order until the script ends or a victory or failure
+    condition is reached. Commands that cannot be applied (walls, unknown
+    commands) are recorded in the trace and play continues, as in the
+    interactive loop.
+
+    Args:
+        env_def: Environment definition dict, or path to an environment JSON file
+        commands: Commands such as "up", "down", "left", "right"
+        keep_trace: Include the result of every command in the output
+
+    Returns:
+        Dict with the final state, victory/failure status, number of
+        commands applied, and the per-command trace if requested
+    """
+    if isinstance(env_def, str):
+        env_def = load_environment_file(env_def)
+    engine = LogicEngine()
+    engine.load_environment(env_def)
+
+    trace = []
+    victory = failure = False
+    applied = 0
+    for command in commands:
+        command = command.strip()
+        if not command:
+            continue
+        result = engine.process_input(command)
+        applied += 1
+        if keep_trace:
+            trace.append(result)
+        victory = bool(result.get("victory"))
+        failure = bool(result.get("failure"))
+        if victory or failure:
+            break
+
+    output = {
+        "final_state": engine.get_current_state(),
+        "victory": victory,
+        "failure": failure,
+        "steps": applied
+    }
+    if keep_trace:
+        output["trace"] = trace
+    return output
+
+
+def _run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one {"env": ..., "moves": [...]} job without a trace."""
+    return run_script(job["env"], job["moves"], keep_trace=False)
+
+
+def run_scripts(jobs: List[Dict[str, Any]], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Run many scripts in parallel worker processes.
+
+    Args:
+        jobs: List of {"env": environment definition or file path, "moves": [commands]} dicts
+        max_workers: Number of worker processes; defaults to the CPU count
+
+    Returns:
+        Results of run_script (without traces), aligned with jobs
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_run_job, jobs, chunksize=max(1, len(jobs) // 64)))
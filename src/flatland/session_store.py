@@ -0,0 +1,244 @@
+"""
+Session storage for running FlatLand environments.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+from . import snapshot
+from .logic_engine import LogicEngine
+
+
+class SessionStore:
+    """Bounded LRU of live engines that spills evicted sessions to SQLite as compressed snapshots.
+
+    A store serves a single process. Live engines are only written to SQLite
+    when evicted, so other processes sharing the database file cannot see a
+    session, or its latest state, while it is live here.
+    """
+
+    def __init__(self, max_live: int = 256, path: str = ":memory:", ttl: Optional[float] = None):
+        """
+        Initialize the session store.
+
+        Args:
+            max_live: Maximum number of LogicEngine instances kept in memory
+            path: SQLite database for snapshots of evicted sessions; use a
+                file path to keep them across restarts (not to share sessions
+                between processes)
+            ttl: Optional number of seconds after its last use that a session
+                is discarded; None keeps sessions until deleted
+        """
+        self.max_live = max_live
+        self.ttl = ttl
+        self._live: "OrderedDict[str, LogicEngine]" = OrderedDict()
+        # sid -> wall-clock time of last use, for live sessions
+        self._touched: Dict[str, float] = {}
+        # sid -> number of use() blocks holding the engine; these are never
+        # evicted or expired, so no change is made after their snapshot
+        self._in_use: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_snapshots "
+            "(sid TEXT PRIMARY KEY, snapshot BLOB NOT NULL, touched_at REAL NOT NULL DEFAULT 0)"
+        )
+        try:
+            # Databases created before sessions expired
+            self._db.execute("ALTER TABLE session_snapshots ADD COLUMN touched_at REAL NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+        self._db.commit()
+
+    def get(self, sid: str) -> Optional[LogicEngine]:
+        """
+        Get the engine for a session, rebuilding it from its snapshot if needed.
+
+        A rebuilt engine starts a fresh undo history at the snapshot state.
+        The engine may be evicted as soon as this returns; use use() to
+        change it.
+
+        Args:
+            sid: Session identifier
+
+        Returns:
+            LogicEngine for the session, or None if the session is unknown
+        """
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            engine = self._live.get(sid)
+            if engine is not None:
+                self._live.move_to_end(sid)
+                self._touched[sid] = now
+                return engine
+
+            row = self._db.execute(
+                "SELECT snapshot, touched_at FROM session_snapshots WHERE sid = ?", (sid,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] >= self.ttl:
+                self._db.execute("DELETE FROM session_snapshots WHERE sid = ?", (sid,))
+                self._db.commit()
+                return None
+
+            data = snapshot.load(row[0])
+            engine = LogicEngine()
+            # The definition was validated when the session was created
+            engine.load_environment(data["environment"], validate=False)
+            engine.state_manager.set_initial_state(data["state"])
+            # Keep versions increasing, so a client's since_version from
+            # before the eviction cannot match a different state
+            engine.state_manager.version = data.get("version", 0)
+            self._live[sid] = engine
+            self._touched[sid] = now
+            self._evict()
+            return engine
+
+    @contextmanager
+    def use(self, sid: str) -> Iterator[Optional[LogicEngine]]:
+        """
+        Get the engine for a session, holding its lock for the block.
+
+        The engine stays live until the block exits, so changes made to it
+        are included in any later snapshot.
+
+        Args:
+            sid: Session identifier
+
+        Yields:
+            LogicEngine for the session, or None if the session is unknown
+        """
+        with self._lock:
+            engine = self.get(sid)
+            if engine is not None:
+                self._in_use[sid] = self._in_use.get(sid, 0) + 1
+        if engine is None:
+            yield None
+            return
+        try:
+            with engine.lock:
+                yield engine
+        finally:
+            with self._lock:
+                if self._in_use[sid] == 1:
+                    del self._in_use[sid]
+                    # Apply an eviction deferred while the engine was in use
+                    self._evict()
+                else:
+                    self._in_use[sid] -= 1
+
+    def put(self, sid: str, engine: LogicEngine) -> None:
+        """
+        Store a live engine for a session.
+
+        Args:
+            sid: Session identifier
+            engine: Engine with an environment loaded
+        """
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            self._live[sid] = engine
+            self._live.move_to_end(sid)
+            self._touched[sid] = now
+            self._evict()
+
+    def delete(self, sid: str) -> bool:
+        """
+        Remove a session and its snapshot.
+
+        Args:
+            sid: Session identifier
+
+        Returns:
+            True if the session existed
+        """
+        with self._lock:
+            existed = self._live.pop(sid, None) is not None
+            self._touched.pop(sid, None)
+            cursor = self._db.execute("DELETE FROM session_snapshots WHERE sid = ?", (sid,))
+            self._db.commit()
+            return existed or cursor.rowcount > 0
+
+    def evict(self, sid: str) -> None:
+        """
+        Snapshot a live session to SQLite and drop the engine from memory.
+
+        Args:
+            sid: Session identifier
+        """
+        with self._lock:
+            if sid in self._in_use:
+                return
+            engine = self._live.pop(sid, None)
+            if engine is not None:
+                self._snapshot(sid, engine, self._touched.pop(sid))
+
+    def __contains__(self, sid: str) -> bool:
+        with self._lock:
+            self._expire(time.time())
+            if sid in self._live:
+                return True
+            return self._db.execute(
+                "SELECT 1 FROM session_snapshots WHERE sid = ?", (sid,)
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._live)
+
+    def _evict(self) -> None:
+        """Snapshot least recently used engines until within max_live, skipping engines in use."""
+        excess = len(self._live) - self.max_live
+        if excess <= 0:
+            return
+        evicted = []
+        for sid in self._live:
+            if sid not in self._in_use:
+                evicted.append(sid)
+                if len(evicted) == excess:
+                    break
+        for sid in evicted:
+            self._snapshot(sid, self._live.pop(sid), self._touched.pop(sid))
+
+    def _expire(self, now: float) -> None:
+        """Drop live sessions unused for longer than the TTL."""
+        if self.ttl is None:
+            return
+        # _live is in least recently used order, so expired sessions are at the front
+        expired = []
+        for sid in self._live:
+            if now - self._touched[sid] < self.ttl:
+                break
+            if sid not in self._in_use:
+                expired.append(sid)
+        for sid in expired:
+            del self._live[sid]
+            del self._touched[sid]
+
+    def _snapshot(self, sid: str, engine: LogicEngine, touched_at: float) -> None:
+        """Persist the environment definition and current state of an engine."""
+        # The engine may still be in use by a request that fetched it earlier
+        with engine.lock:
+            blob = snapshot.dump({
+                "environment": engine.environment,
+                "state": engine.state_manager.current_state,
+                "version": engine.state_manager.version
+            })
+        self._db.execute(
+            "INSERT OR REPLACE INTO session_snapshots (sid, snapshot, touched_at) VALUES (?, ?, ?)",
+            (sid, blob, touched_at)
+        )
+        if self.ttl is not None:
+            self._db.execute(
+                "DELETE FROM session_snapshots WHERE touched_at < ?", (time.time() - self.ttl,)
+            )
+        self._db.commit()
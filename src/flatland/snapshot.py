@@ -0,0 +1,60 @@
+"""
+Compact binary snapshots of FlatLand state for storage outside the process.
+"""
+
+import zlib
+from typing import Any
+
+from . import io_json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# One-byte prefix recording which codec compressed the payload
+_ZSTD = b"Z"
+_ZLIB = b"z"
+
+
+def dump(obj: Any) -> bytes:
+    """
+    Serialize and compress an object.
+
+    Uses zstandard (level 3) when installed and zlib otherwise; load() reads
+    either format.
+
+    Args:
+        obj: JSON-serializable object, e.g. a state dict
+
+    Returns:
+        Compressed snapshot bytes
+    """
+    raw = io_json.dumps(obj).encode("utf-8")
+    if zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=3).compress(raw)
+    return _ZLIB + zlib.compress(raw, 6)
+
+
+def load(blob: bytes) -> Any:
+    """
+    Decompress and deserialize a snapshot produced by dump().
+
+    Args:
+        blob: Snapshot bytes
+
+    Returns:
+        Deserialized object
+
+    Raises:
+        ValueError: If the snapshot format is unknown or needs zstandard
+            and it is not installed
+    """
+    codec, payload = blob[:1], blob[1:]
+    if codec == _ZLIB:
+        return io_json.loads(zlib.decompress(payload))
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise ValueError("Snapshot is zstd-compressed but zstandard is not installed")
+        return io_json.loads(zstandard.ZstdDecompressor().decompress(payload))
+    raise ValueError(f"Unknown snapshot format: {codec!r}")
@@ -2,36 +2,119 @@
 State management module for FlatLand environments.
 """
 
-from typing import Dict, List, Any, Optional, Tuple
-import json
+from typing import Dict, List, Any, Optional, Tuple, Deque
+from collections import deque
 import copy
 
+from . import io_json
+
+
+def _pack_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy a state for the undo/redo stacks with its grid rows stored as bytes.
+    
+    A bytes row takes one byte per cell instead of an 8-byte list slot, and
+    bytes(row) copies a row in C rather than through deepcopy. Grids holding
+    values outside 0-255 are deep-copied as they are.
+    """
+    grid = state.get("grid")
+    packed = copy.deepcopy({k: v for k, v in state.items() if k != "grid"})
+    if grid is None:
+        return packed
+    try:
+        rows = tuple(bytes(row) for row in grid["cells"])
+    except (KeyError, TypeError, ValueError):
+        packed["grid"] = copy.deepcopy(grid)
+    else:
+        packed["grid"] = {k: v for k, v in grid.items() if k != "cells"}
+        packed["grid"]["cells"] = rows
+    return packed
+
+
+def _whole(value: Any) -> Optional[int]:
+    """Return a whole number (e.g. 3 or 3.0) as an int, or None for anything else."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return None
+
+
+def _json_copy(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Copy a state through a JSON round-trip, which is much faster than deepcopy.
+    
+    Returns None if the round-trip would change the state, e.g. turning
+    tuples into lists or int keys into strings, or cannot encode it.
+    """
+    try:
+        copied = io_json.loads(io_json.dumpb(state))
+        if copied == state:
+            return copied
+    except (TypeError, ValueError):
+        # Unencodable values, or values (such as arrays) without a plain ==
+        pass
+    return None
+
+
+def _unpack_state(packed: Dict[str, Any]) -> Dict[str, Any]:
+    """Restore a state produced by _pack_state, rebuilding list grid rows."""
+    grid = packed.get("grid")
+    if grid is not None and isinstance(grid.get("cells"), tuple):
+        grid["cells"] = [list(row) for row in grid["cells"]]
+    return packed
+
 
 class StateManager:
     """Manages the simulation state and history with enhanced capabilities."""
     
-    def __init__(self, max_history: int = 1000):
+    def __init__(self, max_history: int = 1000, max_changes_history: int = 100):
         """
         Initialize the state manager.
         
         Args:
             max_history: Maximum number of states to keep in history
+            max_changes_history: Maximum number of steps kept in the state's
+                changes_history list
         """
         self.current_state: Dict[str, Any] = {}
-        self.history: List[Dict[str, Any]] = []
+        # Oldest states fall off the left end once max_history is reached
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=max_history)
         self.future: List[Dict[str, Any]] = []  # For redo functionality
         self.max_history = max_history
-        
-    def set_initial_state(self, state: Dict[str, Any]):
+        self.max_changes_history = max_changes_history
+        # Incremented whenever current_state changes, so clients can ask for
+        # a diff against the version they already have
+        self.version = 0
+        # Entities at each grid cell, in a flat list indexed by y * width + x
+        # (None for empty cells); built on first use and dropped whenever
+        # current_state is replaced
+        self._position_index: Optional[List[Optional[List[Dict[str, Any]]]]] = None
+        self._index_width = 0
+        self._index_height = 0
+        # Whether current_state survives a JSON round-trip unchanged, so it
+        # can be copied that way; decided once per initial state
+        self._json_safe = True
+        # Set when the grid size or a position is not a whole number, so
+        # entities_at scans the entity list instead of using the index
+        self._index_scan = False
+        
+    def set_initial_state(self, state: Dict[str, Any]) -> None:
         """
         Set the initial simulation state.
         
         Args:
-            state: Initial state dictionary
-        """
-        self.current_state = copy.deepcopy(state)
-        self.history = [copy.deepcopy(state)]
+            state: Initial state dictionary. States that do not survive a JSON
+                round-trip unchanged are deep-copied, and keep being copied
+                that way, which is slower.
+        """
+        copied = _json_copy(state)
+        self._json_safe = copied is not None
+        self.current_state = copied if copied is not None else copy.deepcopy(state)
+        self.history = deque([_pack_state(self.current_state)], maxlen=self.max_history)
         self.future = []
+        self._position_index = None
+        self.version = 0
         
     def get_current_state(self) -> Dict[str, Any]:
         """
@@ -40,9 +123,13 @@ class StateManager:
         Returns:
             Deep copy of the current state
         """
+        # Called for every response; with orjson the JSON round-trip copies
+        # several times faster than deepcopy's per-object dispatch
+        if self._json_safe:
+            return io_json.loads(io_json.dumpb(self.current_state))
         return copy.deepcopy(self.current_state)
     
-    def record_step(self, changes: List[Dict[str, Any]]):
+    def record_step(self, changes: List[Dict[str, Any]]) -> None:
         """
         Record a new state after applying changes.
         
@@ -52,18 +139,20 @@ class StateManager:
         # Clear future states when a new step is recorded
         self.future = []
         
-        # Trim history if it exceeds max_history
-        if len(self.history) >= self.max_history:
-            self.history.pop(0)
-            
         # Add current state to history before updating
-        self.history.append(copy.deepcopy(self.current_state))
+        self.history.append(_pack_state(self.current_state))
+        self.version += 1
         
-        # Store changes in the current state for reference
+        # Store changes in the current state for reference. Keep only recent
+        # steps: every history entry copies this list, so an unbounded list
+        # makes history memory grow quadratically with the number of steps.
         if "changes_history" not in self.current_state:
             self.current_state["changes_history"] = []
             
-        self.current_state["changes_history"].append(changes)
+        changes_history = self.current_state["changes_history"]
+        changes_history.append(changes)
+        if len(changes_history) > self.max_changes_history:
+            del changes_history[:-self.max_changes_history]
     
     def can_undo(self) -> bool:
         """
@@ -94,10 +183,12 @@ class StateManager:
             return None
             
         # Move current state to future
-        self.future.append(copy.deepcopy(self.current_state))
+        self.future.append(_pack_state(self.current_state))
         
         # Restore previous state
-        self.current_state = self.history.pop()
+        self.current_state = _unpack_state(self.history.pop())
+        self._position_index = None
+        self.version += 1
         
         return self.get_current_state()
     
@@ -112,10 +203,12 @@ class StateManager:
             return None
             
         # Move current state to history
-        self.history.append(copy.deepcopy(self.current_state))
+        self.history.append(_pack_state(self.current_state))
         
         # Restore future state
-        self.current_state = self.future.pop()
+        self.current_state = _unpack_state(self.future.pop())
+        self._position_index = None
+        self.version += 1
         
         return self.get_current_state()
     
@@ -300,7 +393,7 @@ class StateManager:
         Returns:
             JSON string representation
         """
-        return json.dumps(state, indent=2)
+        return io_json.dumps(state, indent=True)
     
     def deserialize_state(self, json_str: str) -> Dict[str, Any]:
         """
@@ -312,7 +405,7 @@ class StateManager:
         Returns:
             Deserialized state
         """
-        return json.loads(json_str)
+        return io_json.loads(json_str)
     
     def transform_entity(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -344,6 +437,94 @@ class StateManager:
             "changes": changes
         }
     
+    def entities_at(self, x: int, y: int) -> List[Dict[str, Any]]:
+        """
+        Get the entities at a position in the current state.
+        
+        Args:
+            x: X coordinate
+            y: Y coordinate
+            
+        Returns:
+            Entities at the position, in entity list order; always empty
+            outside the grid
+        """
+        if self._position_index is None:
+            self._build_position_index()
+        if self._index_scan:
+            grid = self.current_state.get("grid", {})
+            if not (0 <= x < grid.get("width", 0) and 0 <= y < grid.get("height", 0)):
+                return []
+            return [
+                e for e in self.current_state.get("entities", [])
+                if e.get("position") is not None and e["position"][0] == x and e["position"][1] == y
+            ]
+        cell = self._cell(x, y)
+        if cell is None or self._position_index is None:
+            return []
+        return self._position_index[cell] or []
+    
+    def _cell(self, x: Any, y: Any) -> Optional[int]:
+        """Position index slot of a position, or None if it is off the grid or not whole."""
+        col, row = _whole(x), _whole(y)
+        if col is None or row is None:
+            return None
+        if not (0 <= col < self._index_width and 0 <= row < self._index_height):
+            return None
+        return row * self._index_width + col
+    
+    def _build_position_index(self) -> None:
+        """Bucket the current state's entities by grid cell."""
+        grid = self.current_state.get("grid", {})
+        width, height = _whole(grid.get("width", 0)), _whole(grid.get("height", 0))
+        if width is None or height is None:
+            self._index_scan = True
+            self._position_index = []
+            return
+        self._index_scan = False
+        self._index_width, self._index_height = width, height
+        index: List[Optional[List[Dict[str, Any]]]] = [None] * (width * height)
+        for entity in self.current_state.get("entities", []):
+            pos = entity.get("position")
+            if pos is None:
+                continue
+            if _whole(pos[0]) is None or _whole(pos[1]) is None:
+                self._index_scan = True
+                break
+            cell = self._cell(pos[0], pos[1])
+            if cell is None:
+                continue
+            bucket = index[cell]
+            if bucket is None:
+                index[cell] = [entity]
+            else:
+                bucket.append(entity)
+        self._position_index = index
+    
+    def _reindex_entity(self, entity: Dict[str, Any], old_pos: List[int], new_pos: List[int]) -> None:
+        """Move an entity between position index buckets after its position changed."""
+        index = self._position_index
+        if index is None or self._index_scan:
+            return
+        if _whole(new_pos[0]) is None or _whole(new_pos[1]) is None:
+            # Not indexable; rebuild (falling back to scans) on next use
+            self._position_index = None
+            return
+        old_cell = self._cell(old_pos[0], old_pos[1])
+        if old_cell is not None:
+            bucket = index[old_cell] or []
+            for i, other in enumerate(bucket):
+                if other is entity:
+                    del bucket[i]
+                    break
+        cell = self._cell(new_pos[0], new_pos[1])
+        if cell is not None:
+            new_bucket = index[cell]
+            if new_bucket is None:
+                index[cell] = [entity]
+            else:
+                new_bucket.append(entity)
+    
     def move_entity(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
         Move entity to new position.
@@ -376,11 +557,11 @@ class StateManager:
             dy = new_pos[1] - old_pos[1]
             box_new_pos = [new_pos[0] + dx, new_pos[1] + dy]
             
-            # Find the box entity
+            # Find the box entity, preferring a box over e.g. a goal in the same cell
+            occupants = self.entities_at(new_pos[0], new_pos[1])
             box_entity = next(
-                (e for e in self.current_state["entities"] 
-                 if e["position"] == new_pos),
-                None
+                (e for e in occupants if e["type"] == "box"),
+                occupants[0] if occupants else None
             )
             if box_entity:
                 # Check if box's new position is valid
@@ -392,6 +573,7 @@ class StateManager:
                     grid["cells"][box_new_pos[1]][box_new_pos[0]] = 3  # Set box's new position
                     # Update box entity position
                     box_entity["position"] = box_new_pos
+                    self._reindex_entity(box_entity, new_pos, box_new_pos)
                 else:
                     return {}  # Invalid move
         
@@ -401,8 +583,7 @@ class StateManager:
         
         # Check if we're moving from a goal cell
         if grid["cells"][old_pos[1]][old_pos[0]] == 2 and any(
-            e["position"] == old_pos and e["type"] == "player"
-            for e in self.current_state["entities"]
+            e["type"] == "player" for e in self.entities_at(old_pos[0], old_pos[1])
         ):
             old_cell_was_goal = True
             
@@ -415,14 +596,24 @@ class StateManager:
             
         grid["cells"][new_pos[1]][new_pos[0]] = entity_type_value  # Set new position
         
+        # Find the entity in the entities list through the position index,
+        # before current (usually the same object) is moved; scan the list
+        # only if current is out of sync with it
+        entity = next(
+            (e for e in self.entities_at(old_pos[0], old_pos[1]) if e["id"] == current["id"]),
+            None
+        )
+        if entity is None:
+            entity = next((e for e in self.current_state["entities"] if e["id"] == current["id"]), None)
+        entity_old_pos: List[int] = entity["position"] if entity is not None else []
+            
         # Update entity position in current_entity
         current["position"] = new_pos
         
         # Also update the entity in the entities list
-        for entity in self.current_state["entities"]:
-            if entity["id"] == current["id"]:
-                entity["position"] = new_pos
-                break
+        if entity is not None:
+            entity["position"] = new_pos
+            self._reindex_entity(entity, entity_old_pos, new_pos)
         
         return {
             "entity": current["id"],
@@ -5,9 +5,36 @@ Schema validation module for FlatLand environments.
 from typing import Dict, Any, Tuple, List, Optional
 import jsonschema
 
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
 from .schemas import ENVIRONMENT_SCHEMA
 from .models import Rule
 
+# Compile the environment schema once at import rather than on every call
+if fastjsonschema is not None:
+    _ENVIRONMENT_CHECK = fastjsonschema.compile(ENVIRONMENT_SCHEMA)
+else:
+    _ENVIRONMENT_CHECK = None
+_ENVIRONMENT_VALIDATOR = jsonschema.validators.validator_for(ENVIRONMENT_SCHEMA)(ENVIRONMENT_SCHEMA)
+
+# Most errors reported for one invalid environment
+_MAX_REPORTED_ERRORS = 10
+
+
+def _environment_errors(env_data: Dict[str, Any]) -> List[str]:
+    """List every schema violation in an environment, ordered by path."""
+    errors = sorted(_ENVIRONMENT_VALIDATOR.iter_errors(env_data), key=lambda e: [str(p) for p in e.path])
+    messages = []
+    for e in errors[:_MAX_REPORTED_ERRORS]:
+        path = ".".join(str(p) for p in e.path) if e.path else "root"
+        messages.append(f"Validation error at {path}: {e.message}")
+    if len(errors) > _MAX_REPORTED_ERRORS:
+        messages.append(f"... and {len(errors) - _MAX_REPORTED_ERRORS} more validation errors")
+    return messages
+
 
 class ValidationError(Exception):
     """Exception raised for schema validation errors."""
@@ -29,16 +56,25 @@ class SchemaValidator:
             env_data: The environment data to validate
             
         Returns:
-            Tuple of (is_valid, error_messages)
+            Tuple of (is_valid, error_messages). All errors are reported, up
+            to a limit, so a generated environment can be fixed in one retry.
         """
-        try:
-            jsonschema.validate(instance=env_data, schema=ENVIRONMENT_SCHEMA)
+        if _ENVIRONMENT_CHECK is not None:
+            # The compiled check stops at the first error; only invalid
+            # environments pay for collecting the rest
+            try:
+                _ENVIRONMENT_CHECK(env_data)
+                return True, None
+            except fastjsonschema.JsonSchemaValueException as e:
+                # fastjsonschema paths start with the root name "data"
+                path = ".".join(str(p) for p in e.path[1:]) or "root"
+                first_error = f"Validation error at {path}: {e.message}"
+            return False, _environment_errors(env_data) or [first_error]
+        
+        errors = _environment_errors(env_data)
+        if not errors:
             return True, None
-        except jsonschema.exceptions.ValidationError as e:
-            # Extract the validation error path and message
-            path = ".".join(str(p) for p in e.path) if e.path else "root"
-            error_msg = f"Validation error at {path}: {e.message}"
-            return False, [error_msg]
+        return False, errors
     
     @staticmethod
     def validate_rule(rule: Rule) -> Tuple[bool, Optional[List[str]]]:
@@ -174,11 +210,11 @@ class DependencyResolver:
         Returns:
             List of cycles, where each cycle is a list of rule names
         """
-        cycles = []
+        cycles: List[List[str]] = []
         visited = set()
-        path = []
+        path: List[str] = []
         
-        def dfs(node):
+        def dfs(node: str) -> None:
             if node in path:
                 # Found a cycle
                 cycle_start = path.index(node)
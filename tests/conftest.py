@@ -0,0 +1,47 @@
+import copy
+
+import pytest
+
+# A small Sokoban level: the player at (1, 1), a box at (3, 1) and a goal at
+# (4, 1), inside a ring of walls. 0=empty, 1=wall, 2=player, 3=box, 4=goal
+SOKOBAN_ENVIRONMENT = {
+    "metadata": {"name": "soko", "description": "Push the box onto the goal"},
+    "initial_state": {
+        "grid": {
+            "width": 6,
+            "height": 5,
+            "cells": [
+                [1, 1, 1, 1, 1, 1],
+                [1, 2, 0, 3, 4, 1],
+                [1, 0, 0, 0, 0, 1],
+                [1, 0, 0, 0, 0, 1],
+                [1, 1, 1, 1, 1, 1],
+            ],
+        },
+        "entities": [
+            {"id": "p", "type": "player", "position": [1, 1], "properties": {"movable": True}},
+            {"id": "b", "type": "box", "position": [3, 1], "properties": {"movable": True}},
+            {"id": "g", "type": "goal", "position": [4, 1], "properties": {}},
+        ],
+    },
+    "rules": [],
+    "victory_conditions": [
+        {"type": "state", "condition": "count_entities_on_goals('box') == 1"}
+    ],
+}
+
+
+@pytest.fixture
+def environment():
+    """A fresh copy of the Sokoban test environment."""
+    return copy.deepcopy(SOKOBAN_ENVIRONMENT)
+
+
+@pytest.fixture
+def engine(environment):
+    """A LogicEngine with the Sokoban test environment loaded."""
+    from flatland.logic_engine import LogicEngine
+
+    engine = LogicEngine()
+    engine.load_environment(environment)
+    return engine
@@ -0,0 +1,76 @@
+from flatland.logic_engine import LogicEngine
+
+
+def _position(engine, entity_id):
+    return next(
+        e["position"] for e in engine.state_manager.current_state["entities"] if e["id"] == entity_id
+    )
+
+
+def test_move(engine):
+    result = engine.process_input("down")
+    assert "error" not in result
+    assert _position(engine, "p") == [1, 2]
+    assert [e["id"] for e in engine.state_manager.entities_at(1, 2)] == ["p"]
+
+
+def test_move_into_wall_is_rejected(engine):
+    result = engine.process_input("up")
+    assert result == {"error": "Cannot move there"}
+    assert _position(engine, "p") == [1, 1]
+    assert engine.state_manager.version == 0
+
+
+def test_move_off_the_grid_is_rejected(environment):
+    # Put the player in the left wall so it stands on the grid edge
+    cells = environment["initial_state"]["grid"]["cells"]
+    cells[1][0], cells[1][1] = 2, 0
+    environment["initial_state"]["entities"][0]["position"] = [0, 1]
+    engine = LogicEngine()
+    engine.load_environment(environment)
+    assert engine.process_input("left") == {"error": "Cannot move there"}
+
+
+def test_push_box(engine):
+    engine.process_input("right")
+    result = engine.process_input("right")
+    assert "error" not in result
+    assert _position(engine, "p") == [3, 1]
+    assert _position(engine, "b") == [4, 1]
+    assert [e["id"] for e in engine.state_manager.entities_at(4, 1) if e["type"] == "box"] == ["b"]
+    assert engine.state_manager.current_state["grid"]["cells"][1][4] == 3
+
+
+def test_push_box_into_wall_is_rejected(engine):
+    for command in ["right", "right"]:
+        engine.process_input(command)
+    state_before = engine.state_manager.get_current_state()
+    result = engine.process_input("right")
+    assert "error" in result
+    assert engine.state_manager.current_state == state_before
+
+
+def test_process_input_diff_for_current_version(engine):
+    manager = engine.state_manager
+    before = manager.get_current_state()
+    result = engine.process_input_diff("down", manager.version)
+    assert "state" not in result
+    assert result["version"] == manager.version == 1
+    applied = manager.apply_diff(before, result["diff"])
+    # The diff covers the grid and the entities
+    assert applied["grid"] == manager.current_state["grid"]
+    assert applied["entities"] == manager.current_state["entities"]
+
+
+def test_process_input_diff_for_stale_version(engine):
+    engine.process_input("down")
+    result = engine.process_input_diff("up", 0)
+    assert "diff" not in result
+    assert result["state"] == engine.state_manager.current_state
+    assert result["version"] == 2
+
+
+def test_game_over_status_follows_the_state(engine):
+    assert engine.check_victory_conditions() is False
+    engine.process_input("down")
+    assert engine.check_victory_conditions() is False
@@ -0,0 +1,57 @@
+from flatland.llm import cache
+from flatland.llm.cache import PromptCache, normalize_description
+
+
+def test_normalize_drops_case_punctuation_and_filler():
+    assert normalize_description("Create a hard 15x15 maze!") == "hard 15x15 maze"
+    assert normalize_description("hard 15x15 maze") == "hard 15x15 maze"
+
+
+def test_normalize_keeps_word_order():
+    assert normalize_description("maze with 3 keys and 5 doors") != normalize_description(
+        "maze with 5 keys and 3 doors"
+    )
+    assert normalize_description("player left of the wall") != normalize_description(
+        "wall left of the player"
+    )
+
+
+def test_lookup_and_store():
+    prompt_cache = PromptCache()
+    assert prompt_cache.lookup("a maze", None, "model") is None
+    prompt_cache.store("a maze", None, "model", {"grid": [1]})
+    assert prompt_cache.lookup("A maze.", None, "model") == {"grid": [1]}
+    assert prompt_cache.lookup("a maze", "dark", "model") is None
+    assert prompt_cache.lookup("a maze", None, "other-model") is None
+
+
+def test_lookup_returns_a_copy():
+    prompt_cache = PromptCache()
+    prompt_cache.store("a maze", None, "model", {"grid": [1]})
+    prompt_cache.lookup("a maze", None, "model")["grid"].append(2)
+    assert prompt_cache.lookup("a maze", None, "model") == {"grid": [1]}
+
+
+def test_least_recently_used_entry_is_evicted():
+    prompt_cache = PromptCache(max_entries=1)
+    prompt_cache.store("first", None, "model", {"n": 1})
+    prompt_cache.store("second", None, "model", {"n": 2})
+    assert prompt_cache.lookup("first", None, "model") is None
+    assert prompt_cache.lookup("second", None, "model") == {"n": 2}
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    prompt_cache = PromptCache(ttl=60)
+    prompt_cache.store("a maze", None, "model", {"n": 1})
+    now[0] += 59
+    assert prompt_cache.lookup("a maze", None, "model") == {"n": 1}
+    now[0] += 2
+    assert prompt_cache.lookup("a maze", None, "model") is None
+
+
+def test_sqlite_entries_are_shared(tmp_path):
+    path = str(tmp_path / "cache.db")
+    PromptCache(path=path).store("a maze", None, "model", {"n": 1})
+    assert PromptCache(path=path).lookup("a maze", None, "model") == {"n": 1}
@@ -0,0 +1,68 @@
+from flatland import session_store
+from flatland.logic_engine import LogicEngine
+from flatland.session_store import SessionStore
+
+
+def _engine(environment):
+    engine = LogicEngine()
+    engine.load_environment(environment)
+    return engine
+
+
+def test_get_unknown_session():
+    store = SessionStore()
+    assert store.get("missing") is None
+    with store.use("missing") as engine:
+        assert engine is None
+
+
+def test_evicted_session_is_restored_with_state_and_version(environment):
+    store = SessionStore(max_live=1)
+    store.put("a", _engine(environment))
+    with store.use("a") as engine:
+        engine.process_input("down")
+        state = engine.state_manager.get_current_state()
+        version = engine.state_manager.version
+
+    store.put("b", _engine(environment))
+    assert len(store) == 1
+    assert "a" in store
+
+    restored = store.get("a")
+    assert restored.state_manager.current_state == state
+    assert restored.state_manager.version == version
+
+
+def test_session_in_use_is_not_evicted(environment):
+    store = SessionStore(max_live=1)
+    original = _engine(environment)
+    store.put("a", original)
+    with store.use("a") as engine:
+        store.put("b", _engine(environment))
+        engine.process_input("down")
+    # The engine stayed live, so the move made after the eviction attempt is kept
+    assert store.get("a") is original
+    assert store.get("a").state_manager.version == 1
+
+
+def test_delete(environment):
+    store = SessionStore(max_live=1)
+    store.put("a", _engine(environment))
+    store.put("b", _engine(environment))
+    assert store.delete("a")
+    assert store.delete("b")
+    assert not store.delete("a")
+    assert "a" not in store
+
+
+def test_idle_sessions_expire(environment, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_store.time, "time", lambda: now[0])
+    store = SessionStore(max_live=1, ttl=60)
+    store.put("a", _engine(environment))
+    store.put("b", _engine(environment))  # "a" is snapshotted
+    now[0] += 30
+    assert store.get("b") is not None
+    now[0] += 45
+    assert store.get("a") is None
+    assert store.get("b") is not None
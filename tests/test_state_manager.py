@@ -0,0 +1,102 @@
+from flatland.state_manager import StateManager, _pack_state, _unpack_state
+
+
+def _state(width=3, height=3, position=(1, 1)):
+    return {
+        "grid": {"width": width, "height": height, "cells": [[0] * 3 for _ in range(3)]},
+        "entities": [{"id": "p", "type": "player", "position": list(position)}],
+    }
+
+
+def test_pack_state_round_trip():
+    state = _state()
+    packed = _pack_state(state)
+    assert isinstance(packed["grid"]["cells"], tuple)
+    assert _unpack_state(packed) == state
+
+
+def test_pack_state_keeps_cells_outside_byte_range():
+    state = _state()
+    state["grid"]["cells"][0][0] = 300
+    assert _unpack_state(_pack_state(state)) == state
+
+
+def test_set_initial_state_copies_the_state():
+    state = _state()
+    manager = StateManager()
+    manager.set_initial_state(state)
+    state["entities"][0]["position"] = [0, 0]
+    assert manager.current_state["entities"][0]["position"] == [1, 1]
+
+
+def test_set_initial_state_keeps_values_json_would_change():
+    state = _state()
+    state["entities"][0]["position"] = (1, 1)
+    state["metadata"] = {1: "int key"}
+    manager = StateManager()
+    manager.set_initial_state(state)
+    assert manager.current_state["entities"][0]["position"] == (1, 1)
+    current = manager.get_current_state()
+    assert current == state
+    assert current is not manager.current_state
+
+
+def test_get_current_state_returns_a_copy():
+    manager = StateManager()
+    manager.set_initial_state(_state())
+    manager.get_current_state()["entities"][0]["position"] = [0, 0]
+    assert manager.current_state["entities"][0]["position"] == [1, 1]
+
+
+def test_entities_at():
+    manager = StateManager()
+    manager.set_initial_state(_state())
+    assert [e["id"] for e in manager.entities_at(1, 1)] == ["p"]
+    assert manager.entities_at(0, 0) == []
+    assert manager.entities_at(5, 1) == []
+    assert manager.entities_at(-1, 1) == []
+
+
+def test_entities_at_whole_float_grid_and_positions():
+    manager = StateManager()
+    manager.set_initial_state(_state(width=3.0, height=3.0, position=(1.0, 2.0)))
+    assert [e["id"] for e in manager.entities_at(1, 2)] == ["p"]
+    assert [e["id"] for e in manager.entities_at(1.0, 2.0)] == ["p"]
+    assert manager.entities_at(1.5, 2) == []
+
+
+def test_entities_at_falls_back_to_scan_for_fractional_values():
+    manager = StateManager()
+    manager.set_initial_state(_state(width=2.5, height=3))
+    assert [e["id"] for e in manager.entities_at(1, 1)] == ["p"]
+
+    manager.set_initial_state(_state(position=(1.5, 1)))
+    assert [e["id"] for e in manager.entities_at(1.5, 1)] == ["p"]
+    assert manager.entities_at(1, 1) == []
+
+
+def test_version_increases_on_every_change(engine):
+    manager = engine.state_manager
+    assert manager.version == 0
+    engine.process_input("down")
+    assert manager.version == 1
+    manager.undo()
+    assert manager.version == 2
+    manager.redo()
+    assert manager.version == 3
+
+
+def test_undo_then_redo_restores_the_state(engine):
+    manager = engine.state_manager
+    engine.process_input("down")
+    after_move = manager.get_current_state()
+    manager.undo()
+    assert manager.redo() == after_move
+    assert manager.current_state == after_move
+
+
+def test_changes_history_is_bounded(engine):
+    engine.state_manager.max_changes_history = 2
+    for command in ["down", "up", "down"]:
+        engine.process_input(command)
+    assert len(engine.state_manager.current_state["changes_history"]) == 2
@@ -0,0 +1,23 @@
+from flatland.validator import SchemaValidator, _MAX_REPORTED_ERRORS
+
+
+def test_valid_environment(environment):
+    assert SchemaValidator.validate_environment(environment) == (True, None)
+
+
+def test_all_errors_are_reported(environment):
+    del environment["metadata"]
+    del environment["initial_state"]
+    is_valid, errors = SchemaValidator.validate_environment(environment)
+    assert not is_valid
+    assert len(errors) == 2
+    assert all(error.startswith("Validation error at root:") for error in errors)
+
+
+def test_reported_errors_are_capped(environment):
+    extra = _MAX_REPORTED_ERRORS + 5
+    environment["initial_state"]["entities"] = [{"type": 1} for _ in range(extra)]
+    is_valid, errors = SchemaValidator.validate_environment(environment)
+    assert not is_valid
+    assert len(errors) == _MAX_REPORTED_ERRORS + 1
+    assert errors[-1].startswith("... and ")